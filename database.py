@@ -2,44 +2,488 @@ import sqlite3
 import logging
 import json
 import asyncio
+import os
+import sys
+import threading
+import time
+import hashlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Размер кэша подготовленных запросов на соединение
+DB_CACHED_STATEMENTS = 256
+
+# Отложенная запись: окно накопления (секунды) и размер пачки для немедленного сброса
+DB_WRITE_WINDOW = float(os.getenv("DB_WRITE_WINDOW", "5"))
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "200"))
+
+# Кэш get_message_data: число записей и время жизни (секунды)
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "256"))
+MESSAGE_CACHE_TTL = float(os.getenv("MESSAGE_CACHE_TTL", "3600"))
+
+# Хранение: сколько дней держать messages и news, как часто запускать очистку (секунды)
+RETENTION_MESSAGES_DAYS = float(os.getenv("RETENTION_MESSAGES_DAYS", "30"))
+RETENTION_NEWS_DAYS = float(os.getenv("RETENTION_NEWS_DAYS", "90"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", str(6 * 3600)))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+
+# Кэш переводов DeepSeek: максимум записей и сколько дней хранить неиспользуемые
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "5000"))
+TRANSLATION_CACHE_DAYS = float(os.getenv("TRANSLATION_CACHE_DAYS", "30"))
+
+class Database:
+    """Долгоживущее соединение с SQLite, принадлежащее отдельному потоку.
+
+    Все запросы к одному файлу базы выполняются последовательно в этом потоке,
+    поэтому соединение открывается один раз, а скомпилированные запросы
+    переиспользуются из кэша sqlite3. База работает в режиме WAL с synchronous=NORMAL,
+    внешние ключи включены (дочерние строки сообщений удаляются каскадом).
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"db-{os.path.basename(db_path)}")
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA busy_timeout=5000')
+            self._conn.execute('PRAGMA foreign_keys=ON')
+            logger.debug(f"[TRACE] Открыто соединение с базой: {self.db_path}")
+        return self._conn
+
+    def _call(self, func):
+        conn = self._connection()
+        try:
+            return func(conn)
+        except Exception:
+            conn.rollback()
+            raise
+
+    async def run(self, func):
+        """Выполняет func(conn) в потоке базы и возвращает результат."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, func)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
+
+class WriteBehindQueue:
+    """Отложенная запись в таблицы news и messages.
+
+    Записи, сделанные в пределах окна window, сливаются и сохраняются одной
+    транзакцией; при накоплении max_batch записей сброс происходит сразу.
+    Функции чтения учитывают ещё не сброшенные записи через pending_*.
+    """
+    def __init__(self, db_path, window=DB_WRITE_WINDOW, max_batch=DB_WRITE_BATCH):
+        self.db_path = db_path
+        self.window = window
+        self.max_batch = max_batch
+        self._news = {}
+        self._messages = {}
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._news) + len(self._messages)
+
+    def add_news(self, news_id, header, source=None, category=None):
+        self._news[news_id] = (header, source, category)
+        self._schedule()
+
+    def add_message(self, news_id, caption, message_ids, file_ids, category):
+        self._messages[news_id] = (caption, list(message_ids), list(file_ids), category)
+        self._schedule()
+
+    def pending_news(self, news_id):
+        return news_id in self._news
+
+    def pending_message(self, news_id):
+        return self._messages.get(news_id)
+
+    def _schedule(self):
+        if len(self) >= self.max_batch:
+            asyncio.get_running_loop().create_task(self.flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        """Сохраняет все накопленные записи одной транзакцией."""
+        async with self._flush_lock:
+            if not len(self):
+                return
+            news, messages = self._news, self._messages
+            news_rows = [(news_id, *row) for news_id, row in news.items()]
+            message_rows = [(news_id, *row) for news_id, row in messages.items()]
+            try:
+                await run_db(self.db_path, lambda conn: _sync_save_batch(conn, news_rows, message_rows))
+            except Exception as e:
+                logger.error(f"[TRACE] Ошибка отложенной записи: {str(e)}")
+                raise
+            # Удаляем только то, что записали: за время записи могли прийти новые данные
+            for news_id, *row in news_rows:
+                if news.get(news_id) == tuple(row):
+                    del news[news_id]
+            for news_id, *row in message_rows:
+                if messages.get(news_id) == tuple(row):
+                    del messages[news_id]
+            self.flushes += 1
+            logger.info(f"[TRACE] Отложенная запись: news={len(news_rows)}, messages={len(message_rows)}")
+
+def _insert_message_children(conn, news_id, message_ids, file_ids):
+    conn.execute('DELETE FROM message_ids WHERE news_id = ?', (news_id,))
+    conn.execute('DELETE FROM message_file_ids WHERE news_id = ?', (news_id,))
+    conn.executemany('INSERT INTO message_ids (news_id, position, message_id) VALUES (?, ?, ?)',
+                     [(news_id, position, message_id) for position, message_id in enumerate(message_ids)])
+    conn.executemany('INSERT INTO message_file_ids (news_id, position, file_id) VALUES (?, ?, ?)',
+                     [(news_id, position, file_id) for position, file_id in enumerate(file_ids)])
+
+def _sync_save_batch(conn, news_rows, message_rows):
+    """news_rows: (news_id, header[, source, category]); message_rows: (news_id, caption, message_ids, file_ids, category)."""
+    cursor = conn.cursor()
+    if news_rows:
+        # created_at выставляется только при первой вставке
+        cursor.executemany('''
+            INSERT INTO news (news_id, header, source, category, created_at)
+            VALUES (?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (news_id) DO UPDATE SET
+                header = excluded.header,
+                source = COALESCE(excluded.source, news.source),
+                category = COALESCE(excluded.category, news.category)
+        ''', [(tuple(row) + (None, None))[:4] for row in news_rows])
+    for news_id, caption, message_ids, file_ids, category in message_rows:
+        cursor.execute('''
+            INSERT INTO messages (news_id, caption, category, created_at)
+            VALUES (?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (news_id) DO UPDATE SET caption = excluded.caption, category = excluded.category
+        ''', (news_id, caption, category))
+        _insert_message_children(conn, news_id, message_ids, file_ids)
+    conn.commit()
+
+class MessageDataCache:
+    """LRU-кэш данных сообщений по (база, news_id) с ограничением размера и времени жизни.
+
+    Заполняется при записи (write-through) и при чтении из базы; счётчики hits/misses
+    доступны через stats().
+    """
+    def __init__(self, max_size=MESSAGE_CACHE_SIZE, ttl=MESSAGE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db_path, news_id):
+        key = (db_path, news_id)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        caption, message_ids, file_ids, category = entry[1]
+        return caption, list(message_ids), list(file_ids), category
+
+    def put(self, db_path, news_id, caption, message_ids, file_ids, category):
+        if self.max_size <= 0:
+            return
+        key = (db_path, news_id)
+        self._entries[key] = (time.monotonic(), (caption, tuple(message_ids), tuple(file_ids), category))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self, db_path=None):
+        if db_path is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == db_path]:
+                del self._entries[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Общий кэш данных сообщений для обработчиков кнопок
+message_cache = MessageDataCache()
+
+class NewsIdArchive:
+    """Компактный архив news_id, вынесенных из таблицы news.
+
+    Хранит отсортированный массив 64-битных хэшей news_id в файле рядом с базой
+    (<база>.ids, 8 байт на новость). Проверка — двоичный поиск в памяти.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._ids = None
+
+    @staticmethod
+    def _hash(news_id):
+        return int.from_bytes(hashlib.blake2b(news_id.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def _load(self):
+        if self._ids is None:
+            ids = array('Q')
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    ids.frombytes(f.read())
+                if sys.byteorder == 'little':
+                    ids.byteswap()
+            self._ids = ids
+        return self._ids
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, news_id):
+        ids = self._load()
+        key = self._hash(news_id)
+        position = bisect_left(ids, key)
+        return position < len(ids) and ids[position] == key
+
+    def add_many(self, news_ids):
+        """Добавляет news_id и атомарно перезаписывает файл архива."""
+        merged = array('Q', sorted(set(self._load()).union(self._hash(news_id) for news_id in news_ids)))
+        stored = array('Q', merged)
+        if sys.byteorder == 'little':
+            stored.byteswap()
+        tmp_path = f"{self.path}.part"
+        with open(tmp_path, 'wb') as f:
+            f.write(stored.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._ids = merged
+
+_databases = {}
+_write_queues = {}
+_archives = {}
+_databases_lock = threading.Lock()
+
+def get_database(db_path):
+    """Общий объект Database для файла базы."""
+    with _databases_lock:
+        database = _databases.get(db_path)
+        if database is None:
+            database = _databases[db_path] = Database(db_path)
+        return database
+
+async def run_db(db_path, func):
+    return await get_database(db_path).run(func)
+
+def get_archive(db_path):
+    """Архив старых news_id для файла базы."""
+    with _databases_lock:
+        archive = _archives.get(db_path)
+        if archive is None:
+            archive = _archives[db_path] = NewsIdArchive(f"{db_path}.ids")
+        return archive
+
+def get_write_queue(db_path):
+    """Общая очередь отложенной записи для файла базы."""
+    with _databases_lock:
+        queue = _write_queues.get(db_path)
+        if queue is None:
+            queue = _write_queues[db_path] = WriteBehindQueue(db_path)
+        return queue
+
+def _pending_queue(db_path):
+    return _write_queues.get(db_path)
+
+async def flush_writes(db_path=None):
+    """Немедленно сбрасывает отложенные записи (для одной базы или для всех)."""
+    if db_path is None:
+        queues = list(_write_queues.values())
+    else:
+        queues = [queue for path, queue in _write_queues.items() if path == db_path]
+    for queue in queues:
+        await queue.flush()
+
+async def close_databases():
+    await flush_writes()
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+        _write_queues.clear()
+    for database in databases:
+        await database.close()
+    logger.debug("[TRACE] Соединения с базой закрыты")
+
+def _migration_1_baseline(conn):
+    """Исходная схема: news, messages и file_id изображений."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS news (
+            news_id TEXT PRIMARY KEY,
+            header TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            news_id TEXT PRIMARY KEY,
+            caption TEXT,
+            message_ids TEXT,
+            file_ids TEXT,
+            category TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_file_ids (
+            content_hash TEXT PRIMARY KEY,
+            file_id TEXT
+        )
+    ''')
+
+def _migration_2_news_metadata(conn):
+    """Время создания, источник и категория новостей и индексы по ним."""
+    # В исходной схеме нет ни одной временной метки, а по news_id время не восстановить.
+    # Поэтому старым строкам ставится время миграции: они будут очищены через
+    # RETENTION_NEWS_DAYS после обновления, а не удалены все разом на первом проходе.
+    conn.execute('ALTER TABLE news ADD COLUMN created_at INTEGER')
+    conn.execute('ALTER TABLE news ADD COLUMN source TEXT')
+    conn.execute('ALTER TABLE news ADD COLUMN category TEXT')
+    conn.execute("UPDATE news SET created_at = CAST(strftime('%s', 'now') AS INTEGER)")
+    conn.execute('''
+        UPDATE news SET category = (SELECT messages.category FROM messages WHERE messages.news_id = news.news_id)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_created_at ON news (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_source ON news (source, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_category ON news (category, created_at)')
+
+def _migration_3_normalize_messages(conn):
+    """JSON-списки message_ids/file_ids переносятся в дочерние таблицы, у messages появляется created_at."""
+    conn.execute('''
+        CREATE TABLE messages_new (
+            news_id TEXT PRIMARY KEY,
+            caption TEXT,
+            category TEXT,
+            created_at INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE message_ids (
+            news_id TEXT NOT NULL REFERENCES messages (news_id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (news_id, position)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE message_file_ids (
+            news_id TEXT NOT NULL REFERENCES messages (news_id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            PRIMARY KEY (news_id, position)
+        ) WITHOUT ROWID
+    ''')
+    rows = conn.execute('SELECT news_id, caption, message_ids, file_ids, category FROM messages').fetchall()
+    # Как и в миграции 2, время создания старых сообщений неизвестно — ставим время миграции
+    conn.executemany(
+        "INSERT INTO messages_new (news_id, caption, category, created_at) VALUES (?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))",
+        [(news_id, caption, category) for news_id, caption, _, _, category in rows])
+    for news_id, _, message_ids, file_ids, _ in rows:
+        _insert_message_children(conn, news_id, json.loads(message_ids or '[]'), json.loads(file_ids or '[]'))
+    conn.execute('DROP TABLE messages')
+    conn.execute('ALTER TABLE messages_new RENAME TO messages')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_category ON messages (category, created_at)')
+
+def _migration_4_translations(conn):
+    """Кэш переводов DeepSeek по хэшу (шаблон промпта, лимит длины, текст)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS translations (
+            cache_key TEXT PRIMARY KEY,
+            translated TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            last_used INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)')
+
+def _migration_5_poll_state(conn):
+    """Состояние опроса источников: адаптивный интервал, оценка частоты новостей, время опросов."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS poll_state (
+            source TEXT PRIMARY KEY,
+            interval REAL NOT NULL,
+            rate REAL,
+            last_poll REAL,
+            next_poll REAL NOT NULL
+        )
+    ''')
+
+# Миграции схемы: (версия, функция). Версия базы хранится в PRAGMA user_version.
+MIGRATIONS = [
+    (1, _migration_1_baseline),
+    (2, _migration_2_news_metadata),
+    (3, _migration_3_normalize_messages),
+    (4, _migration_4_translations),
+    (5, _migration_5_poll_state),
+]
+
+def _sync_migrate(conn):
+    """Применяет недостающие миграции, каждую в своей транзакции.
+
+    На время миграций внешние ключи выключаются: пересоздание таблицы messages
+    иначе каскадом удалило бы дочерние строки. После миграций ссылки проверяются.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys=OFF')
+    try:
+        for target, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info(f"[TRACE] Миграция схемы {version} -> {target}: {migration.__doc__}")
+            conn.execute('BEGIN')
+            try:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {target}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            version = target
+    finally:
+        conn.execute('PRAGMA foreign_keys=ON')
+    violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+    if violations:
+        logger.warning(f"[TRACE] Нарушения внешних ключей после миграции: {len(violations)}")
+    return version
+
 async def create_table(db_path):
     logger.debug(f"[TRACE] Создание таблиц в базе: {db_path}")
-    loop = asyncio.get_event_loop()
-    def sync_create_table():
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS news (
-                    news_id TEXT PRIMARY KEY,
-                    header TEXT
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    news_id TEXT PRIMARY KEY,
-                    caption TEXT,
-                    message_ids TEXT,
-                    file_ids TEXT,
-                    category TEXT
-                )
-            ''')
-            conn.commit()
-    await loop.run_in_executor(None, sync_create_table)
-    logger.debug(f"[TRACE] Таблицы созданы")
+    version = await run_db(db_path, _sync_migrate)
+    logger.debug(f"[TRACE] Таблицы созданы, версия схемы: {version}")
 
-async def save_to_db(db_path, news_id, header):
+async def save_to_db(db_path, news_id, header, source=None, category=None):
     logger.debug(f"[TRACE] Сохранение новости: news_id={news_id}")
-    loop = asyncio.get_event_loop()
-    def sync_save_to_db():
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('INSERT OR REPLACE INTO news (news_id, header) VALUES (?, ?)', (news_id, header))
-            conn.commit()
-    await loop.run_in_executor(None, sync_save_to_db)
+    def sync_save_to_db(conn):
+        _sync_save_batch(conn, [(news_id, header, source, category)], [])
+    await run_db(db_path, sync_save_to_db)
     logger.info(f"[TRACE] Новость сохранена: news_id={news_id}")
 
 async def select_for_db(db_path, value, column):
@@ -49,29 +493,77 @@ async def select_for_db(db_path, value, column):
         value = value[3:]
         logger.warning(f"[TRACE] Обнаружен префикс vk_ в select_for_db: {original_value} -> {value}")
     logger.debug(f"[TRACE] Окончательный value для поиска: {value}")
-    loop = asyncio.get_event_loop()
-    def sync_select_for_db():
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f'SELECT {column} FROM news WHERE {column} = ?', (value,))
-            result = cursor.fetchone()
-            return result
-    result = await loop.run_in_executor(None, sync_select_for_db)
+    queue = _pending_queue(db_path)
+    if column == "news_id" and queue is not None and queue.pending_news(value):
+        logger.debug(f"[TRACE] Результат поиска (ожидает записи): {value}")
+        return (value,)
+    def sync_select_for_db(conn):
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {column} FROM news WHERE {column} = ?', (value,))
+        result = cursor.fetchone()
+        if result is None and column == "news_id" and value in get_archive(db_path):
+            result = (value,)
+        return result
+    result = await run_db(db_path, sync_select_for_db)
     logger.debug(f"[TRACE] Результат поиска: {result}")
     return result
 
+async def select_existing_news_ids(db_path, news_ids):
+    """Возвращает множество news_id из списка, которые уже есть в таблице news (одним запросом)."""
+    news_ids = list(dict.fromkeys(news_ids))
+    logger.debug(f"[TRACE] Пакетная проверка {len(news_ids)} news_id в базе: {db_path}")
+    if not news_ids:
+        return set()
+    def sync_select_existing_news_ids(conn):
+        found = set()
+        cursor = conn.cursor()
+        # SQLite ограничивает число параметров в запросе, поэтому идём пачками
+        for start in range(0, len(news_ids), 500):
+            chunk = news_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT news_id FROM news WHERE news_id IN ({placeholders})', chunk)
+            found.update(row[0] for row in cursor.fetchall())
+        archive = get_archive(db_path)
+        found.update(news_id for news_id in news_ids if news_id not in found and news_id in archive)
+        return found
+    result = await run_db(db_path, sync_select_existing_news_ids)
+    queue = _pending_queue(db_path)
+    if queue is not None:
+        result.update(news_id for news_id in news_ids if queue.pending_news(news_id))
+    logger.debug(f"[TRACE] Уже обработано: {len(result)} из {len(news_ids)}")
+    return result
+
+async def save_news_batch(db_path, rows):
+    """Сохраняет много строк (news_id, header[, source, category]) одной транзакцией."""
+    rows = list(rows)
+    logger.debug(f"[TRACE] Пакетное сохранение новостей: {len(rows)} шт.")
+    if rows:
+        await run_db(db_path, lambda conn: _sync_save_batch(conn, rows, []))
+
+async def save_message_data_batch(db_path, rows):
+    """Сохраняет много строк (news_id, caption, message_ids, file_ids, category) одной транзакцией."""
+    rows = list(rows)
+    logger.debug(f"[TRACE] Пакетное сохранение сообщений: {len(rows)} шт.")
+    if rows:
+        await run_db(db_path, lambda conn: _sync_save_batch(conn, [], rows))
+
+async def queue_news(db_path, news_id, header, source=None, category=None):
+    """Отложенное сохранение новости: попадёт в базу со следующим сбросом очереди."""
+    logger.debug(f"[TRACE] Новость в очереди записи: news_id={news_id}")
+    get_write_queue(db_path).add_news(news_id, header, source, category)
+
+async def queue_message_data(db_path, news_id, caption, message_ids, file_ids, category):
+    """Отложенное сохранение данных сообщения: попадёт в базу со следующим сбросом очереди."""
+    logger.debug(f"[TRACE] Сообщение в очереди записи: news_id={news_id}")
+    get_write_queue(db_path).add_message(news_id, caption, message_ids, file_ids, category)
+    message_cache.put(db_path, news_id, caption, message_ids, file_ids, category)
+
 async def save_message_data(db_path, news_id, caption, message_ids, file_ids, category):
     logger.debug(f"[TRACE] Сохранение сообщения: news_id={news_id}")
-    loop = asyncio.get_event_loop()
-    def sync_save_message_data():
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO messages (news_id, caption, message_ids, file_ids, category)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (news_id, caption, json.dumps(message_ids), json.dumps(file_ids), category))
-            conn.commit()
-    await loop.run_in_executor(None, sync_save_message_data)
+    def sync_save_message_data(conn):
+        _sync_save_batch(conn, [], [(news_id, caption, message_ids, file_ids, category)])
+    await run_db(db_path, sync_save_message_data)
+    message_cache.put(db_path, news_id, caption, message_ids, file_ids, category)
     logger.info(f"[TRACE] Данные сообщения сохранены: news_id={news_id}")
 
 async def get_message_data(db_path, news_id):
@@ -81,16 +573,240 @@ async def get_message_data(db_path, news_id):
         news_id = news_id[3:]
         logger.warning(f"[TRACE] Обнаружен префикс vk_ в get_message_data: {original_news_id} -> {news_id}")
     logger.debug(f"[TRACE] Окончательный news_id для поиска: {news_id}")
-    loop = asyncio.get_event_loop()
-    def sync_get_message_data():
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT caption, message_ids, file_ids, category FROM messages WHERE news_id = ?', (news_id,))
-            result = cursor.fetchone()
-            if result:
-                caption, message_ids, file_ids, category = result
-                return caption, json.loads(message_ids), json.loads(file_ids), category
-            return None
-    result = await loop.run_in_executor(None, sync_get_message_data)
+    cached = message_cache.get(db_path, news_id)
+    if cached is not None:
+        logger.debug(f"[TRACE] Результат поиска из кэша: news_id={news_id}, {message_cache.stats()}")
+        return cached
+    queue = _pending_queue(db_path)
+    pending = queue.pending_message(news_id) if queue is not None else None
+    if pending is not None:
+        caption, message_ids, file_ids, category = pending
+        logger.debug(f"[TRACE] Результат поиска (ожидает записи): news_id={news_id}")
+        return caption, list(message_ids), list(file_ids), category
+    def sync_get_message_data(conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT caption, category FROM messages WHERE news_id = ?', (news_id,))
+        result = cursor.fetchone()
+        if result:
+            caption, category = result
+            cursor.execute('SELECT message_id FROM message_ids WHERE news_id = ? ORDER BY position', (news_id,))
+            message_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT file_id FROM message_file_ids WHERE news_id = ? ORDER BY position', (news_id,))
+            file_ids = [row[0] for row in cursor.fetchall()]
+            return caption, message_ids, file_ids, category
+        return None
+    result = await run_db(db_path, sync_get_message_data)
+    if result is not None:
+        message_cache.put(db_path, news_id, *result)
     logger.debug(f"[TRACE] Результат поиска: {result}")
-    return result
\ No newline at end of file
+    return result
+
+async def save_image_file_ids(db_path, file_ids_by_hash):
+    """Сохраняет соответствие хэш содержимого изображения -> Telegram file_id."""
+    logger.debug(f"[TRACE] Сохранение file_id изображений: {len(file_ids_by_hash)} шт.")
+    if not file_ids_by_hash:
+        return
+    def sync_save_image_file_ids(conn):
+        cursor = conn.cursor()
+        cursor.executemany('INSERT OR REPLACE INTO image_file_ids (content_hash, file_id) VALUES (?, ?)',
+                           list(file_ids_by_hash.items()))
+        conn.commit()
+    await run_db(db_path, sync_save_image_file_ids)
+
+async def get_image_file_ids(db_path, content_hashes):
+    """Возвращает {хэш содержимого: file_id} для уже загруженных в Telegram изображений."""
+    content_hashes = list(dict.fromkeys(content_hashes))
+    logger.debug(f"[TRACE] Поиск file_id для {len(content_hashes)} изображений")
+    if not content_hashes:
+        return {}
+    def sync_get_image_file_ids(conn):
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(content_hashes))
+        cursor.execute(f'SELECT content_hash, file_id FROM image_file_ids WHERE content_hash IN ({placeholders})', content_hashes)
+        return dict(cursor.fetchall())
+    result = await run_db(db_path, sync_get_image_file_ids)
+    logger.debug(f"[TRACE] Найдено file_id: {len(result)}")
+    return result
+
+async def get_translation(db_path, cache_key):
+    """Возвращает сохранённый перевод по ключу кэша или None; отмечает время использования."""
+    def sync_get_translation(conn):
+        row = conn.execute('SELECT translated FROM translations WHERE cache_key = ?', (cache_key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE translations SET last_used = ? WHERE cache_key = ?', (int(time.time()), cache_key))
+        conn.commit()
+        return row[0]
+    result = await run_db(db_path, sync_get_translation)
+    logger.debug(f"[TRACE] Кэш переводов: {'попадание' if result is not None else 'промах'} для {cache_key[:12]}")
+    return result
+
+async def save_translation(db_path, cache_key, translated, max_entries=TRANSLATION_CACHE_SIZE):
+    """Сохраняет перевод в кэш; при превышении max_entries вытесняются давно не использованные записи."""
+    def sync_save_translation(conn):
+        now = int(time.time())
+        conn.execute('''
+            INSERT INTO translations (cache_key, translated, created_at, last_used) VALUES (?, ?, ?, ?)
+            ON CONFLICT (cache_key) DO UPDATE SET translated = excluded.translated, last_used = excluded.last_used
+        ''', (cache_key, translated, now, now))
+        evicted = conn.execute('''
+            DELETE FROM translations WHERE cache_key IN (
+                SELECT cache_key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,)).rowcount
+        conn.commit()
+        return evicted
+    evicted = await run_db(db_path, sync_save_translation)
+    logger.debug(f"[TRACE] Перевод сохранён в кэш: {cache_key[:12]}, вытеснено: {evicted}")
+
+async def load_poll_state(db_path):
+    """Возвращает {источник: {"interval", "rate", "last_poll", "next_poll"}}."""
+    def sync_load_poll_state(conn):
+        rows = conn.execute('SELECT source, interval, rate, last_poll, next_poll FROM poll_state').fetchall()
+        return {source: {"interval": interval, "rate": rate, "last_poll": last_poll, "next_poll": next_poll}
+                for source, interval, rate, last_poll, next_poll in rows}
+    result = await run_db(db_path, sync_load_poll_state)
+    logger.debug(f"[TRACE] Загружено состояние опроса: {len(result)} источников")
+    return result
+
+async def save_poll_state(db_path, source, state):
+    def sync_save_poll_state(conn):
+        conn.execute('''
+            INSERT INTO poll_state (source, interval, rate, last_poll, next_poll) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET interval = excluded.interval, rate = excluded.rate,
+                last_poll = excluded.last_poll, next_poll = excluded.next_poll
+        ''', (source, state["interval"], state["rate"], state["last_poll"], state["next_poll"]))
+        conn.commit()
+    await run_db(db_path, sync_save_poll_state)
+
+def _sync_retention(conn, db_path, messages_days, news_days, vacuum_pages, translations_days=TRANSLATION_CACHE_DAYS):
+    now = int(time.time())
+    stats = {"messages": 0, "news": 0, "archived": 0, "translations": 0, "vacuumed_pages": 0}
+
+    # Старые сообщения больше не нужны для кнопок под постами; message_ids и message_file_ids удаляются каскадом
+    cutoff = now - int(messages_days * 86400)
+    old_messages = [row[0] for row in conn.execute('SELECT news_id FROM messages WHERE created_at < ?', (cutoff,))]
+    if old_messages:
+        conn.executemany('DELETE FROM messages WHERE news_id = ?', [(news_id,) for news_id in old_messages])
+        conn.commit()
+    stats["messages"] = len(old_messages)
+
+    # Старые news_id переезжают в компактный архив; строки удаляются только после записи архива
+    cutoff = now - int(news_days * 86400)
+    old_news = [row[0] for row in conn.execute('''
+        SELECT news_id FROM news WHERE created_at < ? AND news_id NOT IN (SELECT news_id FROM messages)
+    ''', (cutoff,))]
+    if old_news:
+        get_archive(db_path).add_many(old_news)
+        conn.executemany('DELETE FROM news WHERE news_id = ?', [(news_id,) for news_id in old_news])
+        conn.commit()
+    stats["news"] = len(old_news)
+    stats["archived"] = len(get_archive(db_path))
+
+    # Переводы, к которым давно не обращались
+    cutoff = now - int(translations_days * 86400)
+    stats["translations"] = conn.execute('DELETE FROM translations WHERE last_used < ?', (cutoff,)).rowcount
+    conn.commit()
+
+    # Инкрементальный VACUUM возвращает свободные страницы без полной перезаписи файла.
+    # Для старых баз режим auto_vacuum включается один раз полным VACUUM.
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    free_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+    stats["vacuumed_pages"] = free_before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return stats
+
+async def run_retention(db_path, messages_days=RETENTION_MESSAGES_DAYS, news_days=RETENTION_NEWS_DAYS,
+                        vacuum_pages=RETENTION_VACUUM_PAGES):
+    """Один проход очистки: удаление старых messages, архивирование старых news_id, инкрементальный VACUUM."""
+    await flush_writes(db_path)
+    stats = await run_db(db_path, lambda conn: _sync_retention(conn, db_path, messages_days, news_days, vacuum_pages))
+    if stats["messages"]:
+        message_cache.clear(db_path)
+    logger.info(f"[TRACE] Очистка базы {db_path}: удалено messages={stats['messages']}, "
+                f"архивировано news={stats['news']} (в архиве {stats['archived']}), переводов={stats['translations']}, "
+                f"освобождено страниц={stats['vacuumed_pages']}")
+    return stats
+
+async def retention_loop(db_path, interval=RETENTION_INTERVAL):
+    """Фоновая периодическая очистка базы."""
+    while True:
+        try:
+            await run_retention(db_path)
+        except Exception as e:
+            logger.error(f"[TRACE] Ошибка очистки базы {db_path}: {str(e)}")
+        await asyncio.sleep(interval)
+
+def _benchmark(db_path="msn_news.db", operations=2000):
+    """Сравнение ops/sec: новое соединение на каждый запрос против постоянного соединения."""
+    import shutil
+    import tempfile
+    import time
+
+    def legacy_select(path, news_id):
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT news_id FROM news WHERE news_id = ?', (news_id,))
+            return cursor.fetchone()
+
+    def legacy_save(path, news_id, header):
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR REPLACE INTO news (news_id, header) VALUES (?, ?)', (news_id, header))
+            conn.commit()
+
+    async def run_legacy(path, news_ids):
+        loop = asyncio.get_event_loop()
+        started = time.perf_counter()
+        for i, news_id in enumerate(news_ids):
+            await loop.run_in_executor(None, legacy_select, path, news_id)
+            await loop.run_in_executor(None, legacy_save, path, f"bench-legacy-{i}", "header")
+        return 2 * len(news_ids) / (time.perf_counter() - started)
+
+    async def run_pooled(path, news_ids):
+        await create_table(path)
+        started = time.perf_counter()
+        for i, news_id in enumerate(news_ids):
+            await select_for_db(path, news_id, "news_id")
+            await save_to_db(path, f"bench-pooled-{i}", "header")
+        result = 2 * len(news_ids) / (time.perf_counter() - started)
+        await close_databases()
+        return result
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.db")
+        pooled_path = os.path.join(tmp_dir, "pooled.db")
+        shutil.copyfile(db_path, legacy_path)
+        shutil.copyfile(db_path, pooled_path)
+        with sqlite3.connect(db_path) as conn:
+            news_ids = [row[0] for row in conn.execute('SELECT news_id FROM news LIMIT ?', (operations,))]
+        news_ids = (news_ids * (operations // max(len(news_ids), 1) + 1))[:operations]
+        legacy = asyncio.run(run_legacy(legacy_path, news_ids))
+        pooled = asyncio.run(run_pooled(pooled_path, news_ids))
+    print(f"Соединение на каждый запрос: {legacy:.0f} оп/с")
+    print(f"Постоянное соединение (WAL, synchronous=NORMAL): {pooled:.0f} оп/с")
+    print(f"Ускорение: x{pooled / legacy:.1f}")
+
+if __name__ == "__main__":
+    # python database.py bench [путь к базе] — микробенчмарк слоя базы данных
+    # python database.py migrate [путь к базе] — обновление схемы на месте
+    # python database.py retention [путь к базе] — разовая очистка и сжатие
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    path = sys.argv[2] if len(sys.argv) > 2 else "msn_news.db"
+    if command == "retention":
+        async def _retention():
+            await create_table(path)
+            await run_retention(path)
+            await close_databases()
+        asyncio.run(_retention())
+    elif command == "migrate":
+        async def _migrate():
+            await create_table(path)
+            await close_databases()
+        asyncio.run(_migrate())
+    else:
+        _benchmark(path)
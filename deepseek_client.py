@@ -0,0 +1,208 @@
+import aiohttp
+import asyncio
+import os
+import re
+import hashlib
+import time
+import logging
+from dotenv import load_dotenv
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки клиента DeepSeek
+load_dotenv('keys.env')
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "60"))
+DEEPSEEK_RETRIES = int(os.getenv("DEEPSEEK_RETRIES", "3"))
+DEEPSEEK_CONCURRENCY = int(os.getenv("DEEPSEEK_CONCURRENCY", "4"))
+
+# Бюджет входного текста в токенах и грубая оценка символов на токен
+DEEPSEEK_INPUT_TOKENS = int(os.getenv("DEEPSEEK_INPUT_TOKENS", "1500"))
+CHARS_PER_TOKEN = 4
+# Если обрезка по предложениям оставляет меньше этой доли лимита, текст сокращает модель
+LOCAL_TRIM_MIN_RATIO = float(os.getenv("LOCAL_TRIM_MIN_RATIO", "0.6"))
+
+# Предложение: текст до знака конца (с закрывающими кавычками), за которым идёт пробел,
+# заглавная буква или конец строки (parse_article склеивает абзацы без пробелов)
+SENTENCE = re.compile(r'.+?(?:[.!?…]+["»”)]*(?=\s|[A-ZА-ЯЁ"«“]|$)|$)', re.S)
+
+class DeepSeekError(Exception):
+    """Ошибка запроса к DeepSeek после всех попыток."""
+
+class RetryableDeepSeekError(DeepSeekError):
+    """Временная ошибка DeepSeek (429, 5xx), запрос можно повторить."""
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE.findall(text) if sentence.strip()]
+
+def trim_to_token_budget(text, max_tokens=DEEPSEEK_INPUT_TOKENS):
+    """Извлекающее сокращение входа: первые строки (заголовок) и начальные предложения статьи
+    в пределах бюджета токенов. Новости пишутся «перевёрнутой пирамидой», так что начало важнее.
+    Если не помещается ни одно целое предложение, строка обрезается по последнему пробелу в пределах бюджета.
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= budget:
+        return text
+    lines = text.split('\n')
+    kept = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 <= budget:
+            kept.append(line)
+            used += len(line) + 1
+            continue
+        sentences = []
+        for sentence in split_sentences(line):
+            if used + len(sentence) + 1 > budget:
+                break
+            sentences.append(sentence)
+            used += len(sentence) + 1
+        if sentences:
+            kept.append(' '.join(sentences))
+        elif budget - used > 0:
+            cut = line[:budget - used]
+            kept.append(cut.rsplit(' ', 1)[0] if ' ' in cut else cut)
+        break
+    return '\n'.join(kept)
+
+def trim_at_sentence(text, max_length, min_ratio=LOCAL_TRIM_MIN_RATIO):
+    """Обрезает ответ модели до max_length по границе предложения.
+
+    Возвращает None, если после обрезки остаётся меньше min_ratio лимита или только
+    заголовок — тогда нужен повторный запрос к модели.
+    """
+    if len(text) <= max_length:
+        return text
+    result = ''
+    for paragraph in text.split('\n'):
+        candidate = f"{result}\n{paragraph}" if result else paragraph
+        if len(candidate) <= max_length:
+            result = candidate
+            continue
+        # Абзац не помещается целиком: берём его предложения, пока влезают
+        sentences = []
+        for sentence in split_sentences(paragraph):
+            joined = ' '.join(sentences + [sentence])
+            if len(f"{result}\n{joined}" if result else joined) > max_length:
+                break
+            sentences.append(sentence)
+        if sentences:
+            joined = ' '.join(sentences)
+            result = f"{result}\n{joined}" if result else joined
+        break
+    result = result.rstrip()
+    body = result.split('\n', 1)[1].strip() if '\n' in result else ''
+    if not body or len(result) < max_length * min_ratio:
+        return None
+    return result
+
+def translation_cache_key(prompt_template, max_length, text, model=DEEPSEEK_MODEL):
+    """Ключ кэша перевода: смена шаблона промпта, лимита или модели даёт новый ключ."""
+    digest = hashlib.sha256()
+    for part in (prompt_template, str(max_length), model, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+# Как часто для длинного ответа понадобился второй запрос к модели и сколько ответов взято из кэша
+rewrite_metrics = {"rewrites": 0, "over_limit": 0, "trimmed_locally": 0, "fallbacks": 0, "cache_hits": 0}
+
+class DeepSeekClient:
+    """Долгоживущий клиент DeepSeek: пул keep-alive соединений, таймауты,
+    ограниченные повторы со случайной задержкой, лимит параллельных запросов и метрики.
+
+    Слот лимита занимает только сама попытка: во время паузы перед повтором
+    другие запросы могут выполняться.
+    """
+    def __init__(self, api_key=DEEPSEEK_API_KEY, url=DEEPSEEK_API_URL, model=DEEPSEEK_MODEL,
+                 timeout=DEEPSEEK_TIMEOUT, retries=DEEPSEEK_RETRIES, concurrency=DEEPSEEK_CONCURRENCY):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.wait = wait_random_exponential(multiplier=1, max=20)
+        self.concurrency = max(1, concurrency)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = None
+        self.metrics = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _post(self, payload, api_key):
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        started = time.monotonic()
+        try:
+            async with self._get_session().post(self.url, json=payload, headers=headers) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise RetryableDeepSeekError(f"HTTP {resp.status}")
+                if resp.status != 200:
+                    raise DeepSeekError(f"HTTP {resp.status}: {(await resp.text())[:200]}")
+                data = await resp.json(content_type=None)
+        finally:
+            latency = time.monotonic() - started
+            self.metrics["requests"] += 1
+            self.metrics["latency_total"] += latency
+            self.metrics["latency_max"] = max(self.metrics["latency_max"], latency)
+        usage = data.get("usage") or {}
+        self.metrics["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self.metrics["completion_tokens"] += usage.get("completion_tokens", 0)
+        logger.debug(f"DeepSeek ответил за {latency:.2f}с, токены: {usage}")
+        return data["choices"][0]["message"]["content"]
+
+    async def chat(self, prompt, max_tokens=750, api_key=None):
+        """Один запрос к модели; возвращает текст ответа или бросает DeepSeekError."""
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+        }
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.retries),
+                wait=self.wait,
+                retry=retry_if_exception_type((RetryableDeepSeekError, aiohttp.ClientError, asyncio.TimeoutError)),
+                reraise=True,
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        self.metrics["retries"] += 1
+                    async with self._semaphore:
+                        return await self._post(payload, api_key or self.api_key)
+        except DeepSeekError:
+            self.metrics["errors"] += 1
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            self.metrics["errors"] += 1
+            raise DeepSeekError(str(e)) from e
+
+    def stats(self):
+        requests = self.metrics["requests"]
+        return dict(self.metrics, latency_avg=self.metrics["latency_total"] / requests if requests else 0.0)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Общий клиент DeepSeek
+deepseek_client = DeepSeekClient()
@@ -0,0 +1,436 @@
+import aiohttp
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from tenacity import retry, stop_after_attempt, wait_exponential, wait_random, retry_if_exception_type
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки загрузки изображений
+load_dotenv('keys.env')
+IMAGE_CONNECTIONS = int(os.getenv("IMAGE_CONNECTIONS", "20"))
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "30"))
+IMAGE_RETRIES = int(os.getenv("IMAGE_RETRIES", "3"))
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Настройки кэша изображений
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "img/cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# Как часто (секунды) сбрасывать на диск время последнего обращения к файлам кэша
+IMAGE_CACHE_FLUSH_INTERVAL = float(os.getenv("IMAGE_CACHE_FLUSH_INTERVAL", "60"))
+
+# Настройки нормализации изображений перед публикацией.
+# Telegram ужимает фото до 2560 px по большей стороне, VK хранит максимум в тех же пределах,
+# поэтому больший размер только увеличивает время загрузки.
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2560"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+IMAGE_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+class RetryableDownloadError(Exception):
+    """Временная ошибка загрузки (429, 5xx), после которой имеет смысл повторить попытку."""
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def file_content_hash(path):
+    """SHA-256 содержимого файла (блокирующая функция, вызывать через asyncio.to_thread)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(IMAGE_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _place_file(source, target):
+    """Жёсткая ссылка на файл (без копирования), при невозможности — копия."""
+    tmp_target = f"{target}.part"
+    _remove_quietly(tmp_target)
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copyfile(source, tmp_target)
+    os.replace(tmp_target, target)
+
+class ImageCache:
+    """Контентно-адресуемый кэш изображений на диске.
+
+    Файлы лежат в root/<hash[:2]>/<hash> по SHA-256 содержимого, индекс
+    URL -> хэш содержимого хранится в root/index.json. При превышении max_bytes
+    удаляются давно не использованные файлы (LRU). Время обращения при попадании
+    обновляется в памяти и сбрасывается на диск не чаще flush_interval секунд,
+    при записи в кэш и в flush().
+    """
+    def __init__(self, root=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES, flush_interval=IMAGE_CACHE_FLUSH_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._index = None
+        self._dirty = False
+        self._flushed = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _index_path(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _content_path(self, content_hash):
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self._index_path(), 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {"urls": {}, "files": {}}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._index_path()}.part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path())
+        self._dirty = False
+        self._flushed = time.monotonic()
+
+    def _lookup(self, url, path):
+        index = self._load_index()
+        content_hash = index["urls"].get(url_hash(url))
+        if content_hash is None or content_hash not in index["files"]:
+            return None
+        cached = self._content_path(content_hash)
+        if not os.path.isfile(cached):
+            index["files"].pop(content_hash, None)
+            return None
+        index["files"][content_hash]["atime"] = time.time()
+        self._dirty = True
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _place_file(cached, path)
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self._save_index()
+        return content_hash
+
+    def _store(self, url, path):
+        index = self._load_index()
+        content_hash = file_content_hash(path)
+        cached = self._content_path(content_hash)
+        if not os.path.isfile(cached):
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            _place_file(path, cached)
+        index["files"][content_hash] = {"size": os.path.getsize(cached), "atime": time.time()}
+        index["urls"][url_hash(url)] = content_hash
+        self._evict()
+        self._save_index()
+        return content_hash
+
+    def _evict(self):
+        index = self._index
+        total = sum(entry["size"] for entry in index["files"].values())
+        if total <= self.max_bytes:
+            return
+        # Чистим до 90% лимита, чтобы не вытеснять по одному файлу на каждой записи
+        evicted = set()
+        for content_hash, entry in sorted(index["files"].items(), key=lambda item: item[1]["atime"]):
+            if total <= self.max_bytes * 0.9:
+                break
+            _remove_quietly(self._content_path(content_hash))
+            total -= entry["size"]
+            evicted.add(content_hash)
+        for content_hash in evicted:
+            del index["files"][content_hash]
+        index["urls"] = {key: value for key, value in index["urls"].items() if value not in evicted}
+        logger.info(f"Кэш изображений: вытеснено {len(evicted)} файлов, занято {total} байт")
+
+    async def lookup(self, url, path):
+        """Кладёт закэшированное изображение url в path; возвращает хэш содержимого или None."""
+        async with self._lock:
+            content_hash = await asyncio.to_thread(self._lookup, url, path)
+        if content_hash:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return content_hash
+
+    async def store(self, url, path):
+        """Добавляет скачанный файл в кэш; возвращает хэш содержимого."""
+        async with self._lock:
+            return await asyncio.to_thread(self._store, url, path)
+
+    async def flush(self):
+        """Сохраняет индекс, если в нём есть несохранённые времена обращения."""
+        async with self._lock:
+            if self._dirty:
+                await asyncio.to_thread(self._save_index)
+
+class ImageDownloader:
+    """Загрузчик изображений с общим пулом соединений и потоковой записью на диск.
+
+    Если задан cache, повторные URL и одинаковые по содержимому файлы не скачиваются заново.
+    """
+    def __init__(self, connections=IMAGE_CONNECTIONS, concurrency=IMAGE_CONCURRENCY,
+                 max_bytes=IMAGE_MAX_BYTES, timeout=IMAGE_TIMEOUT, cache=None):
+        self.connections = connections
+        self.concurrency = max(1, concurrency)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache = cache
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    @retry(stop=stop_after_attempt(IMAGE_RETRIES), wait=wait_exponential(multiplier=0.5, max=8) + wait_random(0, 0.5),
+           retry=retry_if_exception_type((RetryableDownloadError, aiohttp.ClientError, asyncio.TimeoutError)), reraise=True)
+    async def _fetch(self, url, path):
+        async with self._get_session().get(url) as resp:
+            if resp.status == 429 or resp.status >= 500:
+                raise RetryableDownloadError(f"HTTP {resp.status}")
+            if resp.status != 200:
+                logger.warning(f"Изображение {url} недоступно: HTTP {resp.status}")
+                return False
+            content_type = resp.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                logger.warning(f"Пропуск {url}: тип содержимого {content_type or 'не указан'}")
+                return False
+            if resp.content_length and resp.content_length > self.max_bytes:
+                logger.warning(f"Пропуск {url}: размер {resp.content_length} больше {self.max_bytes}")
+                return False
+
+            # Пишем во временный файл частями, запись на диск вынесена в поток
+            tmp_path = f"{path}.part"
+            f = await asyncio.to_thread(open, tmp_path, 'wb')
+            size = 0
+            try:
+                async for chunk in resp.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        logger.warning(f"Пропуск {url}: больше {self.max_bytes} байт")
+                        return False
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+                if size == 0 or size > self.max_bytes:
+                    await asyncio.to_thread(_remove_quietly, tmp_path)
+            if size == 0:
+                return False
+            await asyncio.to_thread(os.replace, tmp_path, path)
+            return True
+
+    async def download(self, url, path):
+        """Скачивает одно изображение в path; возвращает True при успехе."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if self.cache is not None and await self.cache.lookup(url, path):
+            logger.debug(f"Изображение {url} взято из кэша")
+            return True
+        try:
+            ok = await self._fetch(url, path)
+        except Exception as e:
+            logger.warning(f"Не удалось скачать {url}: {e}")
+            await asyncio.to_thread(_remove_quietly, f"{path}.part")
+            return False
+        if ok and self.cache is not None:
+            try:
+                await self.cache.store(url, path)
+            except Exception as e:
+                logger.warning(f"Не удалось добавить {url} в кэш: {e}")
+        return ok
+
+    async def download_many(self, urls, paths):
+        """Параллельно скачивает изображения одной статьи (не более concurrency одновременно).
+
+        Возвращает список флагов успеха в порядке urls.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async def limited(url, path):
+            async with semaphore:
+                return await self.download(url, path)
+        return await asyncio.gather(*(limited(url, path) for url, path in zip(urls, paths)))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.cache is not None:
+            await self.cache.flush()
+
+def normalize_image(path, max_side=IMAGE_MAX_SIDE, fmt=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Приводит изображение к формату fmt и размеру не больше max_side по большей стороне.
+
+    Реальный формат определяется по содержимому, а не по расширению. Результат
+    пишется рядом с исходным файлом с правильным расширением, исходник удаляется.
+    Возвращает (новый путь, исходный формат, байт до, байт после).
+    Блокирующая функция, выполняется в пуле процессов.
+    """
+    bytes_before = os.path.getsize(path)
+    target = f"{os.path.splitext(path)[0]}{IMAGE_EXTENSIONS[fmt]}"
+    with Image.open(path) as img:
+        source_format = img.format
+        img = ImageOps.exif_transpose(img)
+        resized = max(img.size) > max_side
+        if resized:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        if fmt != "PNG" and (img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)):
+            # Прозрачность заливаем белым: JPEG её не поддерживает, а Telegram показывает чёрный фон
+            rgba = img.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            img = background
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        tmp_target = f"{target}.part"
+        save_options = {"optimize": True}
+        if fmt in ("JPEG", "WEBP"):
+            save_options["quality"] = quality
+        if fmt == "JPEG":
+            save_options["progressive"] = True
+        elif fmt == "WEBP":
+            save_options["method"] = 6
+        img.save(tmp_target, fmt, **save_options)
+
+    # Перекодирование не всегда меньше исходного JPEG, тогда оставляем исходный файл
+    bytes_after = os.path.getsize(tmp_target)
+    if source_format == fmt and bytes_after >= bytes_before and not resized:
+        os.remove(tmp_target)
+        os.replace(path, target)
+        return target, source_format, bytes_before, bytes_before
+    os.replace(tmp_target, target)
+    if target != path:
+        _remove_quietly(path)
+    return target, source_format, bytes_before, bytes_after
+
+_process_pool = None
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # Пул создаётся в работающем боте (поток базы, сессии aiohttp, драйвер Playwright),
+        # поэтому процессы запускаются через spawn: fork такого процесса может зависнуть
+        _process_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+async def normalize_images(paths):
+    """Нормализует изображения в пуле процессов; возвращает новые пути, битые файлы отбрасываются."""
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    results = await asyncio.gather(*(loop.run_in_executor(pool, normalize_image, path) for path in paths),
+                                   return_exceptions=True)
+    normalized = []
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Не удалось обработать изображение {path}: {result}")
+            await asyncio.to_thread(_remove_quietly, path)
+            continue
+        target, source_format, bytes_before, bytes_after = result
+        logger.info(f"Изображение {target}: {source_format} -> {IMAGE_FORMAT}, {bytes_before} -> {bytes_after} байт")
+        normalized.append(target)
+    return normalized
+
+def shutdown_image_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+def article_image_path(news_id, j):
+    """Путь к j-му изображению статьи с любым из поддерживаемых расширений или None."""
+    for extension in IMAGE_EXTENSIONS.values():
+        path = f'img/msn/{news_id}_{j}{extension}'
+        if os.path.isfile(path):
+            return path
+    return None
+
+def article_image_paths(news_id, limit=10):
+    """Изображения статьи по порядку номеров до первого пропуска."""
+    paths = []
+    for j in range(limit):
+        path = article_image_path(news_id, j)
+        if path is None:
+            break
+        paths.append(path)
+    return paths
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Общий кэш и загрузчик изображений
+image_cache = ImageCache()
+image_downloader = ImageDownloader(cache=image_cache)
+
+async def _measure_uploads(upload_url, paths):
+    """Загружает файлы по одному multipart-запросом на upload_url; возвращает суммарное время в секундах."""
+    elapsed = 0.0
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=IMAGE_TIMEOUT * 4)) as session:
+        for path in paths:
+            with open(path, 'rb') as f:
+                form = aiohttp.FormData()
+                form.add_field('photo', f, filename=os.path.basename(path))
+                started = time.perf_counter()
+                async with session.post(upload_url, data=form) as resp:
+                    await resp.read()
+                elapsed += time.perf_counter() - started
+    return elapsed
+
+def _benchmark(paths, uplink_mbit=10.0, upload_url=None):
+    """Сравнение размера и времени загрузки до и после нормализации.
+
+    Если задан upload_url (локальный приёмник или тестовый сервер Telegram), время загрузки
+    замеряется реальными запросами; иначе выводится только оценка по пропускной способности uplink_mbit.
+    """
+    import tempfile
+    total_before = total_after = 0
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        targets = []
+        for i, path in enumerate(paths):
+            copy_path = os.path.join(tmp_dir, f"{i}.download")
+            shutil.copyfile(path, copy_path)
+            target, source_format, bytes_before, bytes_after = normalize_image(copy_path)
+            targets.append(target)
+            total_before += bytes_before
+            total_after += bytes_after
+            print(f"{path}: {source_format} {bytes_before} -> {IMAGE_FORMAT} {bytes_after} байт")
+        elapsed = time.perf_counter() - started
+        saved = 100 * (1 - total_after / total_before) if total_before else 0.0
+        print(f"Итого: {total_before} -> {total_after} байт (экономия {saved:.1f}%), обработка {elapsed:.2f}с")
+        if upload_url:
+            upload_before = asyncio.run(_measure_uploads(upload_url, paths))
+            upload_after = asyncio.run(_measure_uploads(upload_url, targets))
+            print(f"Замер загрузки на {upload_url}: {upload_before:.2f}с -> {upload_after:.2f}с")
+        else:
+            upload_before = total_before * 8 / (uplink_mbit * 1e6)
+            upload_after = total_after * 8 / (uplink_mbit * 1e6)
+            print(f"Оценка загрузки (не замер) при {uplink_mbit} Мбит/с: {upload_before:.2f}с -> {upload_after:.2f}с; "
+                  f"для замера задайте IMAGE_BENCH_UPLOAD_URL")
+
+if __name__ == "__main__":
+    # python images.py <изображения...> — бенчмарк нормализации;
+    # IMAGE_BENCH_UPLOAD_URL — адрес, на который замерять реальную загрузку
+    if len(sys.argv) < 2:
+        print("Использование: python images.py <файлы изображений...>")
+        sys.exit(1)
+    _benchmark(sys.argv[1:], float(os.getenv("IMAGE_BENCH_UPLINK_MBIT", "10")), os.getenv("IMAGE_BENCH_UPLOAD_URL"))
@@ -1,9 +1,13 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from msn_parser import parse_msn
-from telegram_bot import send_to_telegram, start_dispatcher
-from database import create_table, save_to_db, select_for_db
+from msn_parser import parse_msn, browser_pool, crawl_scheduler, page_readiness, content_api, news_id_from_link, MSN_FETCH_MODE
+from telegram_bot import send_to_telegram, translate_with_deepseek, article_prompt_text, start_dispatcher, close_vk_clients, shorts_queue
+from images import image_downloader, shutdown_image_pool
+from deepseek_client import deepseek_client
+from database import create_table, queue_news, select_existing_news_ids, flush_writes, close_databases, retention_loop
+from pipeline import Stage, Pipeline
+from scheduler import SourceScheduler
 import logging
 
 # Настройка логирования
@@ -21,7 +25,19 @@ if not all([TELEGRAM_TOKEN, CHANNEL_ID, DEEPSEEK_API_KEY]):
     missing = [key for key, value in {"TELEGRAM_TOKEN": TELEGRAM_TOKEN, "CHANNEL_ID": CHANNEL_ID, "DEEPSEEK_API_KEY": DEEPSEEK_API_KEY}.items() if not value]
     raise ValueError(f"Не найдены переменные окружения: {', '.join(missing)}. Проверьте файл keys.env")
 
-# Источники MSN с категориями
+# Параллельность стадий конвейера: обход источников, перевод статей, публикация.
+# TRANSLATE_CONCURRENCY — единственная настройка числа одновременно переводимых статей
+# (воркеры стадии translate); DEEPSEEK_CONCURRENCY в deepseek_client.py ограничивает только
+# HTTP-запросы к DeepSeek от всех вызывающих, включая кнопки под постами.
+PIPELINE_CRAWLERS = int(os.getenv("PIPELINE_CRAWLERS", "4"))
+TRANSLATE_CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "4"))
+PIPELINE_PUBLISHERS = int(os.getenv("PIPELINE_PUBLISHERS", "1"))
+
+# Конвейер текущего обхода (для остановки с дренажём)
+news_pipeline = None
+
+# Источники MSN с категориями; каждый опрашивается по своему адаптивному интервалу (scheduler.py)
+# Необязательный ключ "fetch": "browser" или "api" (по умолчанию MSN_FETCH_MODE из keys.env)
 MSN_SOURCES = {
 #    "Investing.com": {"url": "https://www.msn.com/en-us/channel/source/Investing.com/sr-vid-09jfs0v25ptvf09rctrgr4yq8xv8me8ecwggjywpbjxqexp44s2a?item=flightsprg-tipsubsc-v1a?loadi", "category": "default"},
     #"Benzinga": {"url": "https://www.msn.com/en-us/channel/source/Benzinga/sr-vid-bev0jc7bneie4wxhbsia4yhgci2wcs69hn4kv2py2hqriaf7em3s?cvid=21d3675a444b47b2874d46851b8c8b49&ei=12", "category": "default"},
@@ -42,39 +58,113 @@ MSN_SOURCES = {
 }
 
 async def parse_and_send():
-    # Инициализация базы данных
-    await create_table("msn_news.db")
+    global news_pipeline
+    # Уже обработанные статьи отсеиваются по ID до открытия страниц
+    async def known_ids(news_ids):
+        return await select_existing_news_ids("msn_news.db", news_ids)
     
-    for name, source in MSN_SOURCES.items():
+    source_scheduler = SourceScheduler(MSN_SOURCES, "msn_news.db")
+    
+    # Стадии: обход источника -> отбор новых статей -> перевод -> публикация.
+    # Источники обходятся параллельно через общий планировщик, а перевод и публикация
+    # уже найденных статей идут одновременно с обходом следующих источников.
+    async def crawl(item):
+        name, source = item
         logger.info(f"Парсинг {name}...")
-        list_link, list_header, list_text = await parse_msn(name, source["url"])
-        
+        try:
+            list_link, list_header, list_text = await parse_msn(name, source["url"], known_ids=known_ids, fetch=source.get("fetch", MSN_FETCH_MODE))
+        except Exception:
+            await source_scheduler.record_poll(name, None)
+            raise
+        logger.info(f"Завершён парсинг {name}")
+        return [(name, source, list_link, list_header, list_text)]
+    
+    async def select_new_items(name, source, list_link, list_header, list_text):
+        # Одна пакетная проверка на источник вместо запроса на каждую ссылку
+        existing = await select_existing_news_ids("msn_news.db", [news_id_from_link(link) for link in list_link])
+        new_items = []
         for link, header, text in zip(list_link, list_header, list_text):
-            news_id = link[43:58]
+            news_id = news_id_from_link(link)
             logger.debug(f"DEBUG: Обработана ссылка: {link}, news_id для таблицы news: {news_id}")
-            if await select_for_db("msn_news.db", news_id, "news_id") is None:
+            if news_id not in existing:
+                existing.add(news_id)
                 logger.info(f"Сохранение новости {news_id} в базу данных")
-                await save_to_db("msn_news.db", news_id, header)
-                await send_to_telegram(CHANNEL_ID, link, header, text, DEEPSEEK_API_KEY, "msn_news.db", source["category"])
-                await asyncio.sleep(2)  # Задержка для избежания лимитов Telegram
+                await queue_news("msn_news.db", news_id, header, name, source["category"])
+                new_items.append((source, link, header, text))
             else:
                 logger.info(f"Новость {news_id} уже обработана")
-                
-        logger.info(f"Завершён парсинг {name}")
+        return new_items
+    
+    async def dedupe(item):
+        name, source, list_link, list_header, list_text = item
+        try:
+            new_items = await select_new_items(name, source, list_link, list_header, list_text)
+        except Exception:
+            await source_scheduler.record_poll(name, None)
+            raise
+        await source_scheduler.record_poll(name, len(new_items))
+        return new_items
+    
+    async def translate(item):
+        source, link, header, text = item
+        translated_text = await translate_with_deepseek(article_prompt_text(header, text), DEEPSEEK_API_KEY,
+                                                        db_path="msn_news.db")
+        return [(source, link, header, text, translated_text)]
+    
+    async def publish(item):
+        source, link, header, text, translated_text = item
+        await send_to_telegram(CHANNEL_ID, link, header, text, DEEPSEEK_API_KEY, "msn_news.db", source["category"],
+                               translated_text=translated_text)
+    
+    news_pipeline = Pipeline([
+        Stage("crawl", crawl, concurrency=PIPELINE_CRAWLERS),
+        Stage("dedupe", dedupe),
+        Stage("translate", translate, concurrency=TRANSLATE_CONCURRENCY),
+        Stage("publish", publish, concurrency=PIPELINE_PUBLISHERS),
+    ])
+    news_pipeline.start()
+    
+    async def submit(name, source):
+        await news_pipeline.put((name, source))
+    
+    # Когда все начатые опросы отработали, сбрасываем отложенные записи и метрики обхода
+    async def on_idle():
+        await flush_writes("msn_news.db")
+        page_readiness.log_stats()
+    
+    await source_scheduler.run(submit, on_idle)
 
 async def main():
-    # Запуск парсинга в фоновом режиме
+    # Миграции схемы выполняются до запуска задач, которые обращаются к базе
+    await create_table("msn_news.db")
+    
+    # Запуск периодического парсинга в фоновом режиме
     asyncio.create_task(parse_and_send())
     
+    # Фоновая очистка и сжатие базы
+    asyncio.create_task(retention_loop("msn_news.db"))
+    
     # Запуск диспетчера для обработки callback-запросов
     logger.info("Запуск бота для обработки инлайн-кнопок...")
     await start_dispatcher()
 
 async def handle_shutdown():
     logger.info("Остановка бота...")
+    # Уже найденные статьи дообрабатываются до отмены остальных задач
+    if news_pipeline is not None:
+        await news_pipeline.shutdown()
     tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
     for task in tasks:
         task.cancel()
+    await crawl_scheduler.close()
+    await content_api.close()
+    await image_downloader.close()
+    await deepseek_client.close()
+    await close_vk_clients()
+    await shorts_queue.close()
+    shutdown_image_pool()
+    await close_databases()
+    await browser_pool.close()
     logger.info("Бот остановлен")
 
 if __name__ == "__main__":
@@ -2,82 +2,483 @@ from playwright.async_api import async_playwright
 import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
+from images import image_downloader, normalize_images
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from urllib.parse import urlsplit
+import itertools
+import re
 import os
 import logging
+import time
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def download_image(url, path):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                with open(path, 'wb') as f:
-                    f.write(await resp.read())
-                return True
-    return False
+# Настройки пула браузеров
+load_dotenv('keys.env')
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
 
-async def parse_article(context, link, name):
-    page = await context.new_page()
-    await page.goto(link, wait_until="commit")
-    await asyncio.sleep(3)
+# Настройки планировщика обхода: всего загрузок и загрузок на хост. Страницы каналов и статей
+# идут с www.msn.com, а в режиме "api" статьи — с assets.msn.com, поэтому общий лимит рассчитан на два хоста
+CRAWL_GLOBAL_LIMIT = int(os.getenv("CRAWL_GLOBAL_LIMIT", "6"))
+CRAWL_HOST_LIMIT = int(os.getenv("CRAWL_HOST_LIMIT", "3"))
+CRAWL_QUEUE_SIZE = int(os.getenv("CRAWL_QUEUE_SIZE", "50"))
 
-    try:
-        await page.locator('//fluent-button[@name="Continue reading"]').first.click(timeout=20000)
-        logger.info(f"Нажал 'Continue reading' для {link}")
-        await asyncio.sleep(5)
-    except:
-        logger.info(f"Нет кнопки 'Continue reading' для {link}")
-        await asyncio.sleep(2)  # Меньшая задержка для коротких статей
-
-    # Извлечение заголовка
-    header_elem = await page.query_selector('.viewsHeader')
-    header = await header_elem.inner_text() if header_elem else "Без заголовка"
-
-    # Извлечение изображений
-    news_id = link[43:58]
-    image_paths = []
-    imgs_area = await page.query_selector('.article-page')
-    if imgs_area:
-        imgs = await imgs_area.query_selector_all('.article-image-container img')
-        for j, img in enumerate(imgs[:10]):  # Ограничение до 10 изображений
-            img_url = await img.get_attribute('src')
-            if img_url:
-                path = f'img/msn/{news_id}_{j}.png'
-                if await download_image(img_url, path):
-                    image_paths.append(path)
-                    logger.info(f"Скачал изображение {j} для {news_id}")
-
-    # Извлечение текста
-    try:
-        text = await page.locator('cp-article').first.evaluate("node => node.shadowRoot.innerHTML")
-        if not text:
-            text = "Текст не найден"
-    except:
-        text = "Текст не найден"
+# Приоритеты задач: страницы каналов раньше статей
+PRIORITY_CHANNEL = -1
+
+# Режим загрузки статей: "browser" (Firefox) или "api" (JSON, который грузит фронтенд MSN)
+MSN_FETCH_MODE = os.getenv("MSN_FETCH_MODE", "browser")
+MSN_CONTENT_API = os.getenv("MSN_CONTENT_API", "https://assets.msn.com/content/view/v2/Detail")
+MSN_API_TIMEOUT = float(os.getenv("MSN_API_TIMEOUT", "15"))
+MSN_API_CONNECTIONS = int(os.getenv("MSN_API_CONNECTIONS", "10"))
+
+# Источники, у которых ссылки и форматирование в тексте сохраняются
+KEEP_INLINE_TAGS_SOURCES = ['Benzinga', 'Investopedia', 'CoinTelegraph']
+
+# Настройки ожидания готовности страниц (секунды)
+READY_MIN_TIMEOUT = float(os.getenv("READY_MIN_TIMEOUT", "2"))
+READY_MAX_TIMEOUT = float(os.getenv("READY_MAX_TIMEOUT", "20"))
+READY_HISTORY = int(os.getenv("READY_HISTORY", "20"))
+
+# Селекторы готовности страниц MSN
+CHANNEL_READY_SELECTOR = '.text >> a[href^="https://www.msn.com/"]'
+HEADER_SELECTOR = '.viewsHeader'
+IMAGE_SELECTOR = '.article-image-container img'
+CONTINUE_READING_SELECTOR = '//fluent-button[@name="Continue reading"]'
+ARTICLE_PARAGRAPHS_JS = """() => {
+    const article = document.querySelector('cp-article');
+    return article && article.shadowRoot ? article.shadowRoot.querySelectorAll('p').length : 0;
+}"""
+
+class _BrowserSlot:
+    """Один браузер Firefox с контекстом и счётчиками использования."""
+    def __init__(self, index):
+        self.index = index
+        self.browser = None
+        self.context = None
+        self.active = 0
+        self.pages_served = 0
+        self.retiring = False
+
+    def is_healthy(self):
+        return self.browser is not None and self.browser.is_connected() and not self.retiring
+
+class BrowserPool:
+    """Пул долгоживущих браузеров: запускается один раз и переиспользуется всеми источниками.
+
+    Браузер перезапускается после max_pages открытых страниц или при падении.
+    """
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self._playwright = None
+        self._slots = []
+        self._lock = asyncio.Lock()
+        self.launches = 0
+
+    async def start(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+                self._slots = [_BrowserSlot(i) for i in range(self.size)]
+                for slot in self._slots:
+                    await self._launch(slot)
+
+    async def _launch(self, slot):
+        await self._shutdown_slot(slot)
+        slot.browser = await self._playwright.firefox.launch(headless=True)
+        slot.context = await slot.browser.new_context()
+        slot.pages_served = 0
+        slot.retiring = False
+        self.launches += 1
+        logger.info(f"Запущен браузер #{slot.index} (всего запусков: {self.launches})")
+
+    async def _shutdown_slot(self, slot):
+        for closable in (slot.context, slot.browser):
+            if closable is not None:
+                try:
+                    await closable.close()
+                except Exception as e:
+                    logger.debug(f"Ошибка закрытия браузера #{slot.index}: {e}")
+        slot.context = None
+        slot.browser = None
+
+    async def _acquire_slot(self):
+        await self.start()
+        async with self._lock:
+            # Перезапуск упавших браузеров, которые уже никто не использует
+            for slot in self._slots:
+                if not slot.is_healthy() and slot.active == 0:
+                    logger.warning(f"Браузер #{slot.index} недоступен или отработал лимит, перезапуск")
+                    await self._launch(slot)
+            healthy = [slot for slot in self._slots if slot.is_healthy()]
+            if not healthy:
+                # Все браузеры ждут перезапуска, но ещё заняты: дорабатываем на живых
+                healthy = [slot for slot in self._slots if slot.browser is not None and slot.browser.is_connected()]
+            if not healthy:
+                slot = min(self._slots, key=lambda s: s.active)
+                await self._launch(slot)
+                healthy = [slot]
+            slot = min(healthy, key=lambda s: s.active)
+            slot.active += 1
+            return slot
+
+    async def _release_slot(self, slot, crashed):
+        async with self._lock:
+            slot.active -= 1
+            slot.pages_served += 1
+            if crashed or slot.pages_served >= self.max_pages:
+                slot.retiring = True
+            if slot.retiring and slot.active == 0:
+                await self._launch(slot)
+
+    @asynccontextmanager
+    async def page(self):
+        """Выдаёт новую страницу из пула и закрывает её после использования."""
+        slot = await self._acquire_slot()
+        crashed = False
+        page = None
+        try:
+            page = await slot.context.new_page()
+            yield page
+        except Exception:
+            crashed = slot.browser is None or not slot.browser.is_connected()
+            raise
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception:
+                    crashed = crashed or not slot.browser.is_connected()
+            await self._release_slot(slot, crashed)
+
+    async def close(self):
+        async with self._lock:
+            for slot in self._slots:
+                await self._shutdown_slot(slot)
+            self._slots = []
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+        logger.info("Пул браузеров остановлен")
+
+class PageReadiness:
+    """Ожидание готовности страницы по конкретным селекторам вместо фиксированных пауз.
+
+    Таймаут для каждой пары (сайт, шаг) подстраивается под недавние времена
+    загрузки: удвоенный максимум последних READY_HISTORY замеров в пределах
+    [READY_MIN_TIMEOUT, READY_MAX_TIMEOUT]. Все замеры копятся в метриках.
+    """
+    def __init__(self, min_timeout=READY_MIN_TIMEOUT, max_timeout=READY_MAX_TIMEOUT, history=READY_HISTORY):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._samples = defaultdict(lambda: deque(maxlen=history))
+        self._metrics = defaultdict(lambda: {"count": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+
+    def timeout_for(self, site, step):
+        samples = self._samples[(site, step)]
+        if not samples:
+            return self.max_timeout
+        return min(max(max(samples) * 2, self.min_timeout), self.max_timeout)
+
+    def _record(self, site, step, elapsed, ready):
+        self._samples[(site, step)].append(elapsed)
+        metric = self._metrics[(site, step)]
+        metric["count"] += 1
+        metric["total"] += elapsed
+        metric["max"] = max(metric["max"], elapsed)
+        if not ready:
+            metric["timeouts"] += 1
+
+    async def _wait(self, site, step, waiter):
+        timeout = self.timeout_for(site, step)
+        start = time.monotonic()
+        try:
+            await waiter(timeout * 1000)
+            ready = True
+        except Exception:
+            ready = False
+        elapsed = time.monotonic() - start
+        self._record(site, step, elapsed, ready)
+        logger.debug(f"Ожидание {step} для {site}: {elapsed:.2f}с из {timeout:.2f}с, готово={ready}")
+        return ready
+
+    async def selector(self, page, site, step, selector, state="attached"):
+        """Ждёт появления селектора; возвращает False по таймауту."""
+        return await self._wait(site, step, lambda ms: page.wait_for_selector(selector, state=state, timeout=ms))
+
+    async def function(self, page, site, step, expression, arg=None):
+        """Ждёт истинного значения JS-выражения; возвращает False по таймауту."""
+        return await self._wait(site, step, lambda ms: page.wait_for_function(expression, arg=arg, timeout=ms))
+
+    def stats(self):
+        """Метрики ожиданий: {(сайт, шаг): {count, timeouts, avg, max, timeout}}."""
+        return {
+            key: {
+                "count": metric["count"],
+                "timeouts": metric["timeouts"],
+                "avg": metric["total"] / metric["count"] if metric["count"] else 0.0,
+                "max": metric["max"],
+                "timeout": self.timeout_for(*key),
+            }
+            for key, metric in self._metrics.items()
+        }
+
+    def log_stats(self):
+        for (site, step), stat in sorted(self.stats().items()):
+            logger.info(f"Ожидание {step} для {site}: {stat['count']} раз, среднее {stat['avg']:.2f}с, "
+                        f"максимум {stat['max']:.2f}с, таймаутов {stat['timeouts']}, текущий таймаут {stat['timeout']:.2f}с")
+
+class CrawlScheduler:
+    """Глобальный планировщик загрузки страниц для всех источников.
+
+    Держит не более global_limit открытых страниц одновременно и не более
+    host_limit на один хост. Задачи берутся из общей очереди с приоритетами;
+    при заполнении очереди submit() ждёт, пока воркеры её разберут.
+    Задача для хоста, у которого заняты все слоты, откладывается, а воркер берёт
+    следующую: её выполнит тот воркер, который освободит слот этого хоста.
+    """
+    def __init__(self, global_limit=CRAWL_GLOBAL_LIMIT, host_limit=CRAWL_HOST_LIMIT, queue_size=CRAWL_QUEUE_SIZE):
+        self.global_limit = max(1, global_limit)
+        self.host_limit = max(1, host_limit)
+        self._queue = asyncio.PriorityQueue(maxsize=queue_size)
+        self._host_active = defaultdict(int)
+        self._deferred = defaultdict(deque)
+        self._sequence = itertools.count()
+        self._workers = []
+
+    def _ensure_workers(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.global_limit)]
+            logger.info(f"Запущен планировщик обхода: {self.global_limit} воркеров, до {self.host_limit} на хост")
+
+    async def submit(self, url, job, priority=0):
+        """Ставит job() в очередь и возвращает future с его результатом."""
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._sequence), url, job, future))
+        return future
+
+    async def run(self, url, job, priority=0):
+        return await (await self.submit(url, job, priority))
+
+    async def _worker(self, index):
+        while True:
+            entry = await self._queue.get()
+            self._queue.task_done()
+            host = urlsplit(entry[2]).netloc
+            if self._host_active[host] >= self.host_limit:
+                self._deferred[host].append(entry)
+                continue
+            # После своей задачи воркер выполняет отложенные задачи того же хоста
+            while entry is not None:
+                self._host_active[host] += 1
+                try:
+                    await self._run(entry)
+                finally:
+                    self._host_active[host] -= 1
+                entry = self._deferred[host].popleft() if self._deferred[host] else None
+
+    @staticmethod
+    async def _run(entry):
+        priority, _, url, job, future = entry
+        if future.cancelled():
+            return
+        try:
+            result = await job()
+            if not future.cancelled():
+                future.set_result(result)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
 
-    soup = BeautifulSoup(text, 'html.parser')
-    if name not in ['Benzinga', 'Investopedia', 'CoinTelegraph']:
+    def qsize(self):
+        return self._queue.qsize() + sum(len(deferred) for deferred in self._deferred.values())
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for deferred in self._deferred.values():
+            for entry in deferred:
+                entry[4].cancel()
+        self._deferred.clear()
+
+# Общий пул браузеров, планировщик и метрики готовности для всех источников
+browser_pool = BrowserPool()
+crawl_scheduler = CrawlScheduler()
+page_readiness = PageReadiness()
+
+def news_id_from_link(link):
+    """ID новости MSN из ссылки на статью."""
+    return link[43:58]
+
+def article_api_url(link, base=MSN_CONTENT_API):
+    """URL JSON-описания статьи, которое загружает фронтенд MSN, или None для нестатейных ссылок."""
+    path = urlsplit(link).path
+    match = re.search(r'/(ar|vi|gm|ss)-([A-Za-z0-9]+)/?$', path)
+    if not match:
+        return None
+    locale = path.strip('/').split('/')[0] or "en-us"
+    return f"{base}/{locale}/{match.group(2)}"
+
+def extract_text(html, name):
+    """Текст статьи из HTML тела: абзацы <p>, без ссылок и выделений для большинства источников."""
+    soup = BeautifulSoup(html, 'html.parser')
+    if name not in KEEP_INLINE_TAGS_SOURCES:
         for tag in soup.find_all(['a', 'strong']):
             tag.extract()
-    text = ''.join(p.get_text() for p in soup.find_all('p') if p.get_text())
+    return ''.join(p.get_text() for p in soup.find_all('p') if p.get_text())
+
+def parse_article_json(data, name):
+    """Заголовок, текст и URL изображений из JSON статьи MSN."""
+    header = (data.get("title") or "").strip()
+    body = data.get("body") or ""
+    if not header or not body:
+        raise ValueError("В ответе нет заголовка или тела статьи")
+    image_urls = []
+    for image in data.get("imageResources") or []:
+        if image.get("url"):
+            image_urls.append(image["url"])
+    for slide in data.get("slides") or []:
+        image = slide.get("image") or {}
+        if image.get("url"):
+            image_urls.append(image["url"])
+    return header, extract_text(body, name), list(dict.fromkeys(image_urls))
+
+class ContentApiClient:
+    """HTTP-клиент к API контента MSN с общим пулом соединений."""
+    def __init__(self, base=MSN_CONTENT_API, timeout=MSN_API_TIMEOUT, connections=MSN_API_CONNECTIONS):
+        self.base = base
+        self.timeout = timeout
+        self.connections = connections
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:126.0) Gecko/20100101 Firefox/126.0"},
+            )
+        return self._session
+
+    async def fetch_article(self, link):
+        url = article_api_url(link, self.base)
+        if url is None:
+            raise ValueError(f"Не удалось получить ID статьи из ссылки {link}")
+        async with self._get_session().get(url) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Общий клиент API контента MSN
+content_api = ContentApiClient()
+
+async def download_article_images(news_id, image_urls):
+    """Параллельно скачивает до 10 изображений статьи и нормализует их для публикации.
+
+    Пути идут подряд без пропусков: send_to_telegram ищет файлы по порядку номеров.
+    """
+    image_urls = image_urls[:10]  # Ограничение до 10 изображений
+    paths = [f'img/msn/{news_id}_{j}.download' for j in range(len(image_urls))]
+    results = await image_downloader.download_many(image_urls, paths)
+    downloaded = []
+    for j, (path, ok) in enumerate(zip(paths, results)):
+        if ok:
+            downloaded.append(path)
+            logger.info(f"Скачал изображение {j} для {news_id}")
+    image_paths = []
+    for path in await normalize_images(downloaded):
+        target = f'img/msn/{news_id}_{len(image_paths)}{os.path.splitext(path)[1]}'
+        if target != path:
+            os.replace(path, target)
+        image_paths.append(target)
+    return image_paths
+
+async def parse_article(link, name, pool=browser_pool, readiness=page_readiness):
+    async with pool.page() as page:
+        await page.goto(link, wait_until="commit")
+        # Без заголовка или текста статья не публикуется: ошибка отбрасывает её в parse_msn,
+        # news_id не попадает в базу, и статья обходится заново при следующем опросе
+        if not await readiness.selector(page, name, "header", HEADER_SELECTOR):
+            raise TimeoutError(f"{link}: header не загрузился")
+        if not await readiness.function(page, name, "article", f"() => ({ARTICLE_PARAGRAPHS_JS})() > 0"):
+            raise TimeoutError(f"{link}: article не загрузился")
+
+        button = page.locator(CONTINUE_READING_SELECTOR).first
+        if await button.count():
+            paragraphs = await page.evaluate(ARTICLE_PARAGRAPHS_JS)
+            try:
+                await button.click(timeout=readiness.timeout_for(name, "expand") * 1000)
+                logger.info(f"Нажал 'Continue reading' для {link}")
+                await readiness.function(page, name, "expand", f"n => ({ARTICLE_PARAGRAPHS_JS})() > n", paragraphs)
+            except Exception as e:
+                logger.info(f"Не удалось раскрыть статью {link}: {e}")
+        else:
+            logger.info(f"Нет кнопки 'Continue reading' для {link}")
+
+        # Извлечение заголовка
+        header_elem = await page.query_selector(HEADER_SELECTOR)
+        header = await header_elem.inner_text() if header_elem else "Без заголовка"
+
+        # Извлечение изображений
+        news_id = news_id_from_link(link)
+        image_urls = []
+        imgs_area = await page.query_selector('.article-page')
+        if imgs_area:
+            if await imgs_area.query_selector('.article-image-container'):
+                await readiness.selector(page, name, "images", f"{IMAGE_SELECTOR}[src]")
+            imgs = await imgs_area.query_selector_all(IMAGE_SELECTOR)
+            for img in imgs[:10]:  # Ограничение до 10 изображений
+                img_url = await img.get_attribute('src')
+                if img_url:
+                    image_urls.append(img_url)
+
+        # Извлечение текста
+        try:
+            text = await page.locator('cp-article').first.evaluate("node => node.shadowRoot.innerHTML")
+            if not text:
+                text = "Текст не найден"
+        except:
+            text = "Текст не найден"
+
+    # Страница уже закрыта: изображения качаются параллельно без удержания браузера
+    image_paths = await download_article_images(news_id, image_urls)
+    text = extract_text(text, name)
 
-    await page.close()
     return link, header, text, image_paths
 
-async def parse_msn(name, url):
-    async with async_playwright() as playwright:
-        browser = await playwright.firefox.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
-        await page.goto(url, wait_until="commit")
-        await asyncio.sleep(5)
+async def fetch_article_api(link, name, client=None, pool=browser_pool):
+    """Загрузка статьи без браузера; при любой ошибке — откат на parse_article."""
+    client = client or content_api
+    try:
+        header, text, image_urls = parse_article_json(await client.fetch_article(link), name)
+    except Exception as e:
+        logger.info(f"API MSN не отдал статью {link} ({e}), открываю в браузере")
+        return await parse_article(link, name, pool)
+
+    image_paths = await download_article_images(news_id_from_link(link), image_urls)
+    return link, header, text, image_paths
 
-        list_link = []
-        list_header = []
-        list_text = []
-        list_images = []
+async def parse_channel(name, url, pool=browser_pool, readiness=page_readiness):
+    async with pool.page() as page:
+        await page.goto(url, wait_until="commit")
+        await readiness.selector(page, name, "channel", CHANNEL_READY_SELECTOR)
 
         news = await page.query_selector_all('.text')
         links = []
@@ -88,21 +489,49 @@ async def parse_msn(name, url):
             if flag_start >= 0:
                 link = text[flag_start:flag_end]
                 links.append(link)
-        
-        # Фильтрация уникальных ссылок
-        links = list(dict.fromkeys(links))
-
-        tasks = [parse_article(context, link, name) for link in links]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for result in results:
-            if isinstance(result, tuple):
-                link, header, text, images = result
-                list_link.append(link)
-                list_header.append(header)
-                list_text.append(text)
-                list_images.append(images)
-
-        await context.close()
-        await browser.close()
-        return list_link, list_header, list_text
\ No newline at end of file
+
+    # Фильтрация уникальных ссылок
+    return list(dict.fromkeys(links))
+
+async def parse_msn(name, url, pool=browser_pool, scheduler=crawl_scheduler, known_ids=None, fetch=MSN_FETCH_MODE):
+    """Парсит канал и его статьи.
+
+    known_ids — необязательная async-функция, которая по списку news_id возвращает
+    уже обработанные; такие статьи не открываются вовсе.
+    fetch — "browser" или "api"; в режиме "api" браузер нужен только для страницы канала.
+    """
+    links = await scheduler.run(url, lambda: parse_channel(name, url, pool), PRIORITY_CHANNEL)
+
+    if known_ids is not None and links:
+        known = await known_ids([news_id_from_link(link) for link in links])
+        fresh = [link for link in links if news_id_from_link(link) not in known]
+        logger.info(f"{name}: {len(links)} ссылок, новых {len(fresh)}, пропущено известных {len(links) - len(fresh)}")
+        links = fresh
+
+    list_link = []
+    list_header = []
+    list_text = []
+    list_images = []
+
+    # Верхние ссылки канала свежее, поэтому позиция в списке и есть приоритет
+    futures = []
+    for position, link in enumerate(links):
+        # Лимит на хост считается по хосту, к которому реально идёт запрос
+        if fetch == "api":
+            job = lambda link=link: fetch_article_api(link, name, pool=pool)
+            target = article_api_url(link) or link
+        else:
+            job = lambda link=link: parse_article(link, name, pool)
+            target = link
+        futures.append(await scheduler.submit(target, job, position))
+    results = await asyncio.gather(*futures, return_exceptions=True)
+
+    for result in results:
+        if isinstance(result, tuple):
+            link, header, text, images = result
+            list_link.append(link)
+            list_header.append(header)
+            list_text.append(text)
+            list_images.append(images)
+
+    return list_link, list_header, list_text
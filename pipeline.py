@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки конвейера: размер очередей между стадиями, период логирования метрик, время на дренаж при остановке
+load_dotenv('keys.env')
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "50"))
+PIPELINE_STATS_INTERVAL = float(os.getenv("PIPELINE_STATS_INTERVAL", "60"))
+PIPELINE_DRAIN_TIMEOUT = float(os.getenv("PIPELINE_DRAIN_TIMEOUT", "120"))
+
+class Stage:
+    """Стадия конвейера: ограниченная очередь и concurrency воркеров.
+
+    handler(item) возвращает список элементов для следующей стадии (пустой — элемент
+    отброшен). Ошибка обработки логируется и не останавливает стадию.
+    """
+    def __init__(self, name, handler, concurrency=1, queue_size=PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self._workers = []
+        self._started = None
+        self.metrics = {"received": 0, "processed": 0, "emitted": 0, "errors": 0, "busy": 0.0}
+
+    def start(self):
+        if not self._workers:
+            self._started = time.monotonic()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def put(self, item):
+        """Кладёт элемент в очередь стадии; при заполненной очереди ждёт (обратное давление)."""
+        self.metrics["received"] += 1
+        await self.queue.put(item)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            started = time.monotonic()
+            try:
+                results = await self.handler(item) or []
+                self.metrics["processed"] += 1
+                if self.next_stage is not None:
+                    for result in results:
+                        await self.next_stage.put(result)
+                        self.metrics["emitted"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Ошибка стадии {self.name}: {e}")
+            finally:
+                self.metrics["busy"] += time.monotonic() - started
+                self.queue.task_done()
+
+    async def drain(self):
+        """Дожидается обработки всех элементов очереди и останавливает воркеры."""
+        await self.queue.join()
+        await self.stop()
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return dict(self.metrics, depth=self.queue.qsize(),
+                    throughput=self.metrics["processed"] / elapsed if elapsed else 0.0)
+
+class Pipeline:
+    """Цепочка стадий с ограниченными очередями между ними.
+
+    Стадии работают одновременно, поэтому обход следующего источника идёт
+    параллельно с переводом и публикацией предыдущего. drain() останавливает
+    стадии по порядку: каждая дообрабатывает всё, что успела получить.
+    """
+    def __init__(self, stages, stats_interval=PIPELINE_STATS_INTERVAL):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        self.stats_interval = stats_interval
+        self._monitor = None
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        if self._monitor is None and self.stats_interval > 0:
+            self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def put(self, item):
+        await self.stages[0].put(item)
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.log_stats()
+
+    async def drain(self):
+        for stage in self.stages:
+            await stage.drain()
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        self.log_stats()
+
+    async def shutdown(self, timeout=PIPELINE_DRAIN_TIMEOUT):
+        """Остановка с дренажём: новые элементы не принимаются, уже полученные дообрабатываются
+        не дольше timeout секунд, после чего оставшиеся воркеры отменяются."""
+        await self.stages[0].stop()
+        while not self.stages[0].queue.empty():
+            self.stages[0].queue.get_nowait()
+            self.stages[0].queue.task_done()
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Конвейер не успел дообработать элементы за {timeout}с, остановка")
+            for stage in self.stages:
+                await stage.stop()
+            self.log_stats()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def log_stats(self):
+        for stage in self.stages:
+            stats = stage.stats()
+            logger.info(f"Стадия {stage.name}: в очереди {stats['depth']}, обработано {stats['processed']} "
+                        f"({stats['throughput']:.2f}/с), передано дальше {stats['emitted']}, ошибок {stats['errors']}, "
+                        f"занятость {stats['busy']:.1f}с")
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+import logging
+from dotenv import load_dotenv
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram Bot API: около 30 сообщений в секунду на бота, 1 в секунду в личный чат,
+# 20 в минуту в группу или канал. Можно переопределить в keys.env.
+load_dotenv('keys.env')
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_RATE_PER_MINUTE", "20"))
+TELEGRAM_GROUP_BURST = float(os.getenv("TELEGRAM_GROUP_BURST", "3"))
+# Сколько раз повторять запрос после ответа RetryAfter
+TELEGRAM_RETRY_AFTER_ATTEMPTS = int(os.getenv("TELEGRAM_RETRY_AFTER_ATTEMPTS", "3"))
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity в запасе.
+
+    Ожидающие обслуживаются по очереди: каждый под блокировкой резервирует токены (запас может
+    уйти в минус) и узнаёт своё время ожидания, а спит уже без блокировки.
+    pause() блокирует ведро, например на время RetryAfter.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        """Забирает tokens токенов и возвращает время ожидания.
+
+        Ждёт, пока в ведре наберётся tokens токенов (но не больше capacity): запрос дороже
+        ёмкости ведра, например медиагруппа в канал, уходит при полном ведре, а остаток
+        долга ждут следующие запросы.
+        """
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            delay = max(self.blocked_until - now, (min(tokens, self.capacity) - self.tokens) / self.rate)
+            self.tokens -= tokens
+        waited = 0.0
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            # Пока ждали, pause() мог продлить блокировку
+            delay = self.blocked_until - time.monotonic()
+        return waited
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class TelegramRateLimiter(BaseRequestMiddleware):
+    """Middleware сессии aiogram: все запросы бота проходят через общее и початовое ведро токенов.
+
+    Отправка в чат стоит столько токенов, сколько сообщений появится (медиагруппа — по числу фото).
+    Ответы на нажатия кнопок (answerCallbackQuery) не ограничиваются: они не создают сообщений,
+    а пользователь ждёт их сразу.
+    На ответ RetryAfter ведро чата (или общее, если чата нет) ставится на паузу, и запрос повторяется.
+    """
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                 group_rate_per_minute=TELEGRAM_GROUP_RATE_PER_MINUTE, group_burst=TELEGRAM_GROUP_BURST,
+                 retry_attempts=TELEGRAM_RETRY_AFTER_ATTEMPTS):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.group_burst = group_burst
+        self.retry_attempts = max(1, retry_attempts)
+        self._chat_buckets = {}
+        self.metrics = {"requests": 0, "throttled": 0, "wait_total": 0.0, "retry_after": 0}
+
+    def _chat_bucket(self, chat_id):
+        # Один чат приходит и числом, и строкой из keys.env ('-100…'): ведро у них общее
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            # Отрицательные id и @username — группы и каналы
+            is_group = not key.lstrip('-').isdigit() or key.startswith('-')
+            bucket = TokenBucket(self.group_rate, self.group_burst) if is_group else TokenBucket(self.chat_rate, 1)
+            self._chat_buckets[key] = bucket
+        return bucket
+
+    @staticmethod
+    def _cost(method):
+        media = getattr(method, "media", None)
+        return len(media) if isinstance(media, list) else 1
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, AnswerCallbackQuery):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        cost = self._cost(method)
+        for attempt in range(1, self.retry_attempts + 1):
+            waited = await chat_bucket.acquire(cost) if chat_bucket is not None else 0.0
+            waited += await self.global_bucket.acquire(1)
+            self.metrics["requests"] += 1
+            if waited > 0:
+                self.metrics["throttled"] += 1
+                self.metrics["wait_total"] += waited
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.metrics["retry_after"] += 1
+                (chat_bucket or self.global_bucket).pause(e.retry_after)
+                logger.warning(f"Telegram просит подождать {e.retry_after}с ({type(method).__name__}, chat_id={chat_id}), "
+                               f"попытка {attempt} из {self.retry_attempts}")
+                if attempt == self.retry_attempts:
+                    raise
+
+    def stats(self):
+        return dict(self.metrics)
+
+# Общий ограничитель запросов бота
+telegram_rate_limiter = TelegramRateLimiter()
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки очереди рендеринга: число процессов, максимум ожидающих задач, сколько завершённых задач помнить
+load_dotenv('keys.env')
+SHORTS_WORKERS = int(os.getenv("SHORTS_WORKERS", "1"))
+SHORTS_QUEUE_SIZE = int(os.getenv("SHORTS_QUEUE_SIZE", "20"))
+SHORTS_JOBS_HISTORY = 100
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+class RenderJob:
+    """Задача рендеринга: аргументы функции, статус, результат и данные вызывающего кода (context)."""
+    def __init__(self, job_id, args, notify, context):
+        self.id = job_id
+        self.args = args
+        self.notify = notify
+        self.context = context
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        # Место в очереди, о котором последний раз сообщили через notify
+        self.reported_position = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+
+class RenderQueue:
+    """Очередь тяжёлых синхронных задач (рендеринг Shorts), выполняемых в пуле процессов.
+
+    Одновременно выполняется не больше workers задач; остальные ждут в очереди.
+    При каждой смене статуса вызывается notify(job), а ожидающим задачам — ещё и при смене
+    места в очереди. Задачу из очереди можно отменить сразу; у выполняющейся задачи результат
+    по завершении отбрасывается со статусом cancelled.
+
+    Процессы пула запускаются методом spawn: fork процесса с циклом событий, потоком базы
+    и соединениями aiohttp может зависнуть на унаследованных блокировках.
+    """
+    def __init__(self, render, workers=SHORTS_WORKERS, queue_size=SHORTS_QUEUE_SIZE):
+        self.render = render
+        self.workers = max(1, workers)
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._pool = None
+        self._tasks = []
+
+    def _ensure_started(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Запущена очередь рендеринга: {self.workers} процессов")
+
+    async def submit(self, args, notify=None, context=None):
+        """Ставит render(*args) в очередь; при переполнении бросает asyncio.QueueFull."""
+        self._ensure_started()
+        if self._queue.full():
+            raise asyncio.QueueFull()
+        job = RenderJob(next(self._ids), args, notify, context or {})
+        self._jobs[job.id] = job
+        self._forget_finished()
+        # Уведомление о постановке в очередь приходит раньше, чем воркер возьмёт задачу
+        await self._notify(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            await self._finish(job, JOB_CANCELLED)
+            raise
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Место задачи в очереди (1 — следующая на выполнение), 0 — если она уже не ждёт."""
+        if job.status != JOB_QUEUED:
+            return 0
+        waiting = [other for other in self._jobs.values() if other.status == JOB_QUEUED]
+        return waiting.index(job) + 1
+
+    async def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return False
+        job.cancel_requested = True
+        if job.status == JOB_QUEUED:
+            await self._finish(job, JOB_CANCELLED)
+            await self._notify_waiting()
+        logger.info(f"Отмена задачи рендеринга {job.id} ({job.status})")
+        return True
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != JOB_QUEUED:
+                    continue
+                job.status = JOB_RUNNING
+                job.started = time.monotonic()
+                await self._notify(job)
+                await self._notify_waiting()
+                try:
+                    result = await loop.run_in_executor(self._pool, self.render, *job.args)
+                except Exception as e:
+                    job.error = str(e)
+                    logger.error(f"Ошибка задачи рендеринга {job.id}: {e}")
+                    await self._finish(job, JOB_CANCELLED if job.cancel_requested else JOB_FAILED)
+                    continue
+                job.result = result
+                if job.cancel_requested:
+                    status = JOB_CANCELLED
+                else:
+                    status = JOB_DONE if result else JOB_FAILED
+                await self._finish(job, status)
+            finally:
+                self._queue.task_done()
+
+    async def _finish(self, job, status):
+        job.status = status
+        job.finished = time.monotonic()
+        if job.started is not None:
+            logger.info(f"Задача рендеринга {job.id}: {status} за {job.finished - job.started:.1f}с "
+                        f"(ожидание {job.started - job.created:.1f}с)")
+        await self._notify(job)
+
+    async def _notify(self, job):
+        if job.notify is None:
+            return
+        if job.status == JOB_QUEUED:
+            job.reported_position = self.position(job)
+        try:
+            await job.notify(job)
+        except Exception as e:
+            logger.warning(f"Ошибка уведомления о задаче рендеринга {job.id}: {e}")
+
+    async def _notify_waiting(self):
+        """Сообщает ожидающим задачам, чьё место в очереди изменилось."""
+        for job in list(self._jobs.values()):
+            # Статусы могут измениться, пока ждём предыдущее уведомление
+            if job.status == JOB_QUEUED and job.reported_position != self.position(job):
+                await self._notify(job)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - SHORTS_JOBS_HISTORY)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        counts = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import random
+import time
+import logging
+from dotenv import load_dotenv
+from database import load_poll_state, save_poll_state
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки опроса источников (секунды): границы интервала, начальный интервал,
+# доля случайного разброса и окно, на которое растягиваются просроченные опросы после перезапуска
+load_dotenv('keys.env')
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "120"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "3600"))
+POLL_DEFAULT_INTERVAL = float(os.getenv("POLL_DEFAULT_INTERVAL", "600"))
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.2"))
+POLL_STARTUP_SPREAD = float(os.getenv("POLL_STARTUP_SPREAD", "120"))
+# Сколько новых статей в среднем ожидать за один опрос и вес последнего опроса в оценке частоты
+POLL_TARGET_NEW = float(os.getenv("POLL_TARGET_NEW", "1"))
+POLL_RATE_SMOOTHING = 0.3
+
+class SourceScheduler:
+    """Периодический опрос источников с адаптивным интервалом.
+
+    Для каждого источника хранится сглаженная оценка частоты новых news_id (в секунду);
+    интервал подбирается так, чтобы за опрос появлялось около POLL_TARGET_NEW статей,
+    и ограничивается [min_interval, max_interval]. К каждому интервалу добавляется
+    случайный разброс, чтобы опросы не совпадали. Состояние сохраняется в базе,
+    поэтому перезапуск не приводит к одновременному обходу всех источников.
+    """
+    def __init__(self, sources, db_path, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL,
+                 default_interval=POLL_DEFAULT_INTERVAL, jitter=POLL_JITTER, startup_spread=POLL_STARTUP_SPREAD):
+        self.sources = sources
+        self.db_path = db_path
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.default_interval = min(max(default_interval, self.min_interval), self.max_interval)
+        self.jitter = jitter
+        self.startup_spread = startup_spread
+        self.state = {}
+        self._in_flight = set()
+        self._wakeup = asyncio.Event()
+
+    async def load(self):
+        saved = await load_poll_state(self.db_path)
+        now = time.time()
+        for name in self.sources:
+            state = saved.get(name) or {"interval": self.default_interval, "rate": None, "last_poll": None, "next_poll": now}
+            # Просроченные за время простоя опросы растягиваются по окну запуска
+            if state["next_poll"] <= now:
+                state["next_poll"] = now + random.uniform(0, min(state["interval"], self.startup_spread))
+            self.state[name] = state
+        for name, state in self.state.items():
+            logger.info(f"Источник {name}: интервал {state['interval']:.0f}с, опрос через {state['next_poll'] - now:.0f}с")
+
+    def _interval_for(self, rate):
+        if not rate:
+            return self.max_interval
+        return min(max(POLL_TARGET_NEW / rate, self.min_interval), self.max_interval)
+
+    async def record_poll(self, name, new_count):
+        """Учитывает результат опроса и планирует следующий. new_count=None — опрос не удался."""
+        state = self.state[name]
+        now = time.time()
+        if new_count is not None:
+            elapsed = now - state["last_poll"] if state["last_poll"] else state["interval"]
+            observed = new_count / max(elapsed, 1.0)
+            state["rate"] = observed if state["rate"] is None else (
+                POLL_RATE_SMOOTHING * observed + (1 - POLL_RATE_SMOOTHING) * state["rate"])
+            state["interval"] = self._interval_for(state["rate"])
+            state["last_poll"] = now
+        state["next_poll"] = now + state["interval"] * (1 + random.uniform(-self.jitter, self.jitter))
+        self._in_flight.discard(name)
+        self._wakeup.set()
+        await save_poll_state(self.db_path, name, state)
+        logger.info(f"Источник {name}: новых статей {new_count}, следующий опрос через {state['next_poll'] - now:.0f}с")
+
+    async def run(self, submit, on_idle=None):
+        """Бесконечный цикл: передаёт источники, которым пора, в submit(name, source).
+
+        on_idle() вызывается, когда все запущенные опросы завершились.
+        """
+        await self.load()
+        while True:
+            now = time.time()
+            for name, source in self.sources.items():
+                if name not in self._in_flight and self.state[name]["next_poll"] <= now:
+                    self._in_flight.add(name)
+                    await submit(name, source)
+            waiting = [state["next_poll"] for name, state in self.state.items() if name not in self._in_flight]
+            delay = max(min(waiting) - time.time(), 0.0) if waiting else self.max_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if on_idle is not None and not self._in_flight and self._wakeup.is_set():
+                await on_idle()
@@ -1,7 +1,6 @@
 from aiogram import Bot, Dispatcher
 from aiogram.types import InputMediaPhoto, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
-import aiohttp
 import asyncio
 import os
 import logging
@@ -9,14 +8,16 @@ import traceback
 from bs4 import BeautifulSoup
 import re
 from dotenv import load_dotenv
-from database import save_message_data, get_message_data, select_for_db
-import vk_api
-from vk_api.exceptions import ApiError
-import requests
-from aiohttp import ClientConnectionError, ClientOSError
+from database import queue_message_data, get_message_data, select_for_db, get_image_file_ids, save_image_file_ids, get_translation, save_translation
+from deepseek_client import deepseek_client, DeepSeekError, rewrite_metrics, trim_to_token_budget, trim_at_sentence, translation_cache_key
+from images import file_content_hash, article_image_paths, IMAGE_EXTENSIONS
+from rate_limiter import telegram_rate_limiter
+from vk_client import VkClient, VkApiError, VK_UPLOAD_CONCURRENCY
+from aiohttp import ClientError, ClientConnectionError, ClientOSError
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 import time
-from video_generator import generate_shorts
+from video_generator import render_shorts
+from render_queue import RenderQueue, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_CANCELLED
 
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG, force=True)
@@ -51,17 +52,23 @@ logger.debug(f"[TRACE] Проверка переменных: TELEGRAM_TOKEN={bo
 
 # Инициализация бота и VK API
 bot = Bot(token=TELEGRAM_TOKEN)
+# Все запросы бота проходят через ограничитель частоты с обработкой RetryAfter
+bot.session.middleware(telegram_rate_limiter)
 dp = Dispatcher()
-try:
-    vk_default_session = vk_api.VkApi(token=VK_DEFAULT_TOKEN)
-    vk_fashion_session = vk_api.VkApi(token=VK_FASHION_TOKEN)
-    vk_default = vk_default_session.get_api()
-    vk_fashion = vk_fashion_session.get_api()
+vk_default = VkClient(VK_DEFAULT_TOKEN) if VK_DEFAULT_TOKEN else None
+vk_fashion = VkClient(VK_FASHION_TOKEN) if VK_FASHION_TOKEN else None
+if vk_default and vk_fashion:
     logger.debug("[TRACE] VK API инициализирован успешно")
-except Exception as e:
-    logger.error(f"[TRACE] Ошибка инициализации VK API: {str(e)}")
-    vk_default = None
-    vk_fashion = None
+else:
+    logger.error("[TRACE] Ошибка инициализации VK API: не заданы токены VK")
+
+# Очередь рендеринга Shorts в пуле процессов
+shorts_queue = RenderQueue(render_shorts)
+
+async def close_vk_clients():
+    for vk in (vk_default, vk_fashion):
+        if vk is not None:
+            await vk.close()
 
 def clean_caption(caption):
     """Очистка подписи от HTML-тегов, сохраняя переносы строк."""
@@ -88,7 +95,7 @@ def format_vk_caption(caption):
     logger.debug(f"[TRACE] Форматированная подпись VK, длина: {len(result)}")
     return result
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type((requests.RequestException, ClientOSError)))
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type((ClientError, asyncio.TimeoutError)))
 async def upload_photo_to_vk(photo_url, group_id, category):
     """Загружает фотографию в VK."""
     vk = vk_fashion if category == "fashion" else vk_default
@@ -97,17 +104,16 @@ async def upload_photo_to_vk(photo_url, group_id, category):
         logger.error("[TRACE] VK API не инициализирован")
         raise ValueError("VK API не инициализирован")
     try:
-        upload_server = vk.photos.getMessagesUploadServer(group_id=abs(group_id))
-        upload_url = upload_server['upload_url']
+        upload_url = await vk.get_photo_upload_server(abs(group_id))
         logger.debug(f"[TRACE] Получен upload_url: {upload_url}")
-        photo_response = requests.get(photo_url, timeout=10)
-        photo_response.raise_for_status()
-        photo_file = photo_response.content
-        upload_response = requests.post(upload_url, files={'photo': ('photo.jpg', photo_file)}, timeout=10)
-        upload_response.raise_for_status()
-        upload_data = upload_response.json()
+        try:
+            upload_data = await vk.upload_from_url(upload_url, 'photo', 'photo.jpg', photo_url)
+        except (ClientError, asyncio.TimeoutError):
+            # Адрес сервера загрузки мог устареть: при повторе он будет запрошен заново
+            vk.forget_photo_upload_server(abs(group_id))
+            raise
         logger.debug(f"[TRACE] Ответ upload: {upload_data}")
-        saved_photo = vk.photos.saveMessagesPhoto(
+        saved_photo = await vk.call('photos.saveMessagesPhoto',
             photo=upload_data['photo'],
             server=upload_data['server'],
             hash=upload_data['hash']
@@ -115,11 +121,30 @@ async def upload_photo_to_vk(photo_url, group_id, category):
         photo_id = f"photo{saved_photo[0]['owner_id']}_{saved_photo[0]['id']}"
         logger.info(f"[TRACE] Фото загружено в VK: {photo_id}")
         return photo_id
-    except (ApiError, requests.RequestException, ClientOSError) as e:
+    except (VkApiError, ClientError, asyncio.TimeoutError) as e:
         logger.error(f"[TRACE] Ошибка загрузки фото в VK: {str(e)}")
         raise
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type((ApiError, requests.RequestException)))
+async def upload_photos_to_vk(file_ids, group_id, category):
+    """Загружает фото поста в VK параллельно (не больше VK_UPLOAD_CONCURRENCY одновременно).
+
+    Возвращает id загруженных фото в исходном порядке; фото с ошибкой пропускаются.
+    """
+    semaphore = asyncio.Semaphore(max(1, VK_UPLOAD_CONCURRENCY))
+    async def upload_one(file_id):
+        async with semaphore:
+            try:
+                logger.debug(f"[TRACE] Получение file_info: file_id={file_id}")
+                file_info = await bot.get_file(file_id)
+                photo_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{file_info.file_path}"
+                return await upload_photo_to_vk(photo_url, group_id, category)
+            except Exception as e:
+                logger.error(f"[TRACE] Ошибка обработки file_id={file_id}: {str(e)}")
+                return None
+    photo_ids = await asyncio.gather(*(upload_one(file_id) for file_id in file_ids))
+    return [photo_id for photo_id in photo_ids if photo_id]
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type((VkApiError, ClientError)))
 async def post_to_vk(message_text, attachments, group_id, category):
     """Публикует пост в VK."""
     vk = vk_fashion if category == "fashion" else vk_default
@@ -129,7 +154,8 @@ async def post_to_vk(message_text, attachments, group_id, category):
         raise ValueError("VK API не инициализирован")
     try:
         publish_time1 = int(time.time()) + 600
-        response = vk.wall.post(
+        response = await vk.call(
+            'wall.post',
             owner_id=group_id,
             message=message_text,
             attachments=','.join(attachments) if attachments else None,
@@ -139,50 +165,74 @@ async def post_to_vk(message_text, attachments, group_id, category):
         )
         logger.info(f"[TRACE] Пост создан в VK: post_id={response['post_id']}")
         return True, response['post_id']
-    except ApiError as e:
+    except VkApiError as e:
         logger.error(f"[TRACE] Ошибка VK API: {str(e)}")
         return False, str(e)
     except Exception as e:
         logger.error(f"[TRACE] Неизвестная ошибка VK: {str(e)}")
         return False, str(e)
 
-async def translate_with_deepseek(text, api_key, max_length=980):
+# Шаблоны промптов DeepSeek; входят в ключ кэша переводов
+REWRITE_PROMPT = (
+    "Перепиши текст в кратком стиле для Telegram. Один вариант на русском языке, без Markdown, HTML, эмодзи, рекламы, ссылок. "
+    "Формат: заголовок, пустая строка, текст с абзацами. Макс. длина: {max_length} символов: {text}"
+)
+SHORTEN_PROMPT = (
+    "Сократи текст до {max_length} символов, сохранив информацию, не указывай итоговое количество символов либо иную постороннюю информацию. Формат: заголовок, пустая строка, текст: {text}"
+)
+
+async def translate_with_deepseek(text, api_key, max_length=980, db_path="msn_news.db"):
     logger.debug(f"[TRACE] translate_with_deepseek: длина текста={len(text)}")
-    async with aiohttp.ClientSession() as session:
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": (
-                        f"Перепиши текст в кратком стиле для Telegram. Один вариант на русском языке, без Markdown, HTML, эмодзи, рекламы, ссылок. "
-                        f"Формат: заголовок, пустая строка, текст с абзацами. Макс. длина: {max_length} символов: {text}"
-                    )
-                }
-            ],
-            "max_tokens": 750
-        }
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        async with session.post("https://api.deepseek.com/v1/chat/completions", json=payload, headers=headers) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                translated_text = data["choices"][0]["message"]["content"]
-                if len(translated_text) > max_length:
-                    logger.info(f"[TRACE] Текст превышает лимит ({len(translated_text)} > {max_length}), повторная обработка")
-                    payload["messages"][0]["content"] = (
-                        f"Сократи текст до {max_length-100} символов, сохранив информацию, не указывай итоговое количество символов либо иную постороннюю информацию. Формат: заголовок, пустая строка, текст: {translated_text}"
-                    )
-                    async with session.post("https://api.deepseek.com/v1/chat/completions", json=payload, headers=headers) as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            translated_text = data["choices"][0]["message"]["content"]
-                logger.debug(f"[TRACE] Перевод успешен, длина: {len(translated_text)}")
-                return translated_text
-            logger.warning(f"[TRACE] Ошибка DeepSeek: {resp.status}")
-            return text
+    trimmed_text = trim_to_token_budget(text)
+    if len(trimmed_text) < len(text):
+        logger.debug(f"[TRACE] Вход сокращён до бюджета токенов: {len(text)} -> {len(trimmed_text)}")
+    cache_key = translation_cache_key(REWRITE_PROMPT + SHORTEN_PROMPT, max_length, trimmed_text)
+    try:
+        cached = await get_translation(db_path, cache_key)
+    except Exception as e:
+        logger.warning(f"[TRACE] Ошибка чтения кэша переводов: {str(e)}")
+        cached = None
+    if cached is not None:
+        rewrite_metrics["cache_hits"] += 1
+        logger.debug(f"[TRACE] Перевод взят из кэша, длина: {len(cached)}")
+        return cached
+    prompt = REWRITE_PROMPT.format(max_length=max_length, text=trimmed_text)
+    try:
+        translated_text = await deepseek_client.chat(prompt, max_tokens=750, api_key=api_key)
+        rewrite_metrics["rewrites"] += 1
+        if len(translated_text) > max_length:
+            rewrite_metrics["over_limit"] += 1
+            local_text = trim_at_sentence(translated_text, max_length)
+            if local_text is not None:
+                rewrite_metrics["trimmed_locally"] += 1
+                logger.info(f"[TRACE] Текст превышает лимит ({len(translated_text)} > {max_length}), обрезан по предложениям до {len(local_text)}")
+                translated_text = local_text
+        if len(translated_text) > max_length:
+            rewrite_metrics["fallbacks"] += 1
+            logger.info(f"[TRACE] Текст превышает лимит ({len(translated_text)} > {max_length}), повторная обработка "
+                        f"(повторных запросов: {rewrite_metrics['fallbacks']} из {rewrite_metrics['rewrites']})")
+            prompt = SHORTEN_PROMPT.format(max_length=max_length - 100, text=translated_text)
+            try:
+                translated_text = await deepseek_client.chat(prompt, max_tokens=750, api_key=api_key)
+            except DeepSeekError as e:
+                logger.warning(f"[TRACE] Ошибка сокращения DeepSeek: {str(e)}")
+    except DeepSeekError as e:
+        logger.warning(f"[TRACE] Ошибка DeepSeek: {str(e)}")
+        return text
+    # Несокращённый из-за ошибки ответ не кэшируем, чтобы в следующий раз попробовать снова
+    if len(translated_text) <= max_length:
+        try:
+            await save_translation(db_path, cache_key, translated_text)
+        except Exception as e:
+            logger.warning(f"[TRACE] Ошибка сохранения перевода в кэш: {str(e)}")
+    logger.debug(f"[TRACE] Перевод успешен, длина: {len(translated_text)}, метрики: {deepseek_client.stats()}, {rewrite_metrics}")
+    return translated_text
+
+def article_prompt_text(header, text):
+    return f"{header}\n\n{text}"
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type((TelegramNetworkError, ClientConnectionError, ClientOSError)))
-async def send_to_telegram(channel_id, link, header, text, api_key, db_path, category):
+async def send_to_telegram(channel_id, link, header, text, api_key, db_path, category, translated_text=None):
     logger.debug(f"[TRACE] send_to_telegram: channel_id={channel_id}, category={category}")
     if not link:
         logger.error(f"[TRACE] Некорректная ссылка: {link}")
@@ -198,7 +248,9 @@ async def send_to_telegram(channel_id, link, header, text, api_key, db_path, cat
     except Exception as e:
         logger.error(f"[TRACE] Ошибка доступа к img/msn: {str(e)}")
     
-    translated_text = await translate_with_deepseek(f"{header}\n\n{text}", api_key)
+    # Статьи обхода переводит стадия translate конвейера (main.py); без готового перевода переводим здесь
+    if translated_text is None:
+        translated_text = await translate_with_deepseek(article_prompt_text(header, text), api_key, db_path=db_path)
     logger.debug(f"[TRACE] Очистка текста, длина: {len(translated_text)}")
     translated_text = re.sub(r'[\*_\[\]]', '', translated_text)
     soup = BeautifulSoup(translated_text, 'html.parser')
@@ -240,16 +292,26 @@ async def send_to_telegram(channel_id, link, header, text, api_key, db_path, cat
     logger.debug(f"[TRACE] Создана клавиатура: forward_{news_id}, forward_vk_{news_id}, create_shorts_{news_id}")
     
     media = []
-    j = 0
-    while os.path.isfile(f'img/msn/{news_id}_{j}.png') and j < 10:
-        file_path = f'img/msn/{news_id}_{j}.png'
+    media_hashes = []
+    for file_path in article_image_paths(news_id):
         logger.debug(f"[TRACE] Проверка файла: {file_path}, exists={os.path.exists(file_path)}, readable={os.access(file_path, os.R_OK)}")
         if os.access(file_path, os.R_OK):
             logger.debug(f"[TRACE] Найден файл: {file_path}")
             media.append(InputMediaPhoto(media=FSInputFile(file_path)))
+            media_hashes.append(await asyncio.to_thread(file_content_hash, file_path))
         else:
             logger.warning(f"[TRACE] Файл недоступен: {file_path}")
-        j += 1
+    
+    # Изображения, которые уже загружались в Telegram, отправляются по file_id
+    try:
+        known_file_ids = await get_image_file_ids(db_path, media_hashes)
+    except Exception as e:
+        logger.warning(f"[TRACE] Ошибка поиска file_id изображений: {str(e)}")
+        known_file_ids = {}
+    for i, content_hash in enumerate(media_hashes):
+        if content_hash in known_file_ids:
+            media[i] = InputMediaPhoto(media=known_file_ids[content_hash])
+            logger.debug(f"[TRACE] Изображение {i} отправляется по file_id: {known_file_ids[content_hash]}")
     
     message_ids = []
     file_ids = []
@@ -277,27 +339,27 @@ async def send_to_telegram(channel_id, link, header, text, api_key, db_path, cat
             file_ids.append(message.photo[-1].file_id)
             logger.info(f"[TRACE] Отправлено изображение: news_id={news_id}, message_id={message.message_id}")
         elif len(media) > 1:
-            logger.debug(f"[TRACE] Отправка медиагруппы: news_id={news_id}")
-            for i, m in enumerate(media):
-                try:
-                    message = await bot.send_photo(
-                        chat_id=channel_id,
-                        photo=m.media,
-                        caption=caption if i == 0 else None,
-                        parse_mode="HTML" if i == 0 else None,
-                        reply_markup=keyboard if i == 0 else None
-                    )
-                except TelegramBadRequest as e:
-                    logger.warning(f"[TRACE] Ошибка HTML: {str(e)}. Отправка без HTML")
-                    message = await bot.send_photo(
-                        chat_id=channel_id,
-                        photo=m.media,
-                        caption=clean_caption(caption) if i == 0 else None,
-                        parse_mode=None if i == 0 else None,
-                        reply_markup=keyboard if i == 0 else None
-                    )
-                message_ids.append(message.message_id)
-                file_ids.append(message.photo[-1].file_id)
+            # Альбом уходит одним запросом; кнопки нельзя прикрепить к медиагруппе,
+            # поэтому они отправляются следом коротким сообщением с заголовком
+            logger.debug(f"[TRACE] Отправка медиагруппы: news_id={news_id}, изображений={len(media)}")
+            media[0].caption = caption
+            media[0].parse_mode = "HTML"
+            try:
+                messages = await bot.send_media_group(chat_id=channel_id, media=media)
+            except TelegramBadRequest as e:
+                logger.warning(f"[TRACE] Ошибка HTML: {str(e)}. Отправка без HTML")
+                media[0].caption = clean_caption(caption)
+                media[0].parse_mode = None
+                messages = await bot.send_media_group(chat_id=channel_id, media=media)
+            message_ids.extend(message.message_id for message in messages)
+            file_ids.extend(message.photo[-1].file_id for message in messages)
+            keyboard_message = await bot.send_message(
+                chat_id=channel_id,
+                text=clean_caption(caption).split('\n', 1)[0] or news_id,
+                disable_web_page_preview=True,
+                reply_markup=keyboard
+            )
+            message_ids.append(keyboard_message.message_id)
             logger.info(f"[TRACE] Отправлена медиагруппа: news_id={news_id}, message_ids={message_ids}")
         else:
             logger.debug(f"[TRACE] Отправка текста: news_id={news_id}")
@@ -321,9 +383,15 @@ async def send_to_telegram(channel_id, link, header, text, api_key, db_path, cat
             message_ids.append(message.message_id)
             logger.info(f"[TRACE] Отправлено текстовое сообщение: news_id={news_id}, message_id={message.message_id}")
         
+        if file_ids:
+            try:
+                await save_image_file_ids(db_path, dict(zip(media_hashes, file_ids)))
+            except Exception as e:
+                logger.warning(f"[TRACE] Ошибка сохранения file_id изображений: {str(e)}")
+        
         logger.debug(f"[TRACE] Сохранение данных: news_id={news_id}")
         try:
-            await save_message_data(db_path, news_id, caption, message_ids, file_ids, category)
+            await queue_message_data(db_path, news_id, caption, message_ids, file_ids, category)
             logger.info(f"[TRACE] Данные сохранены: news_id={news_id}")
         except Exception as e:
             logger.error(f"[TRACE] Ошибка сохранения: {str(e)}")
@@ -336,8 +404,7 @@ async def send_to_telegram(channel_id, link, header, text, api_key, db_path, cat
         logger.error(f"[TRACE] Ошибка отправки: news_id={news_id}, ошибка: {str(e)}")
         return None, None
     
-    for j in range(10):
-        path = f'img/msn/{news_id}_{j}.png'
+    for path in (f'img/msn/{news_id}_{j}{extension}' for j in range(10) for extension in IMAGE_EXTENSIONS.values()):
         if os.path.isfile(path):
             try:
                 os.remove(path)
@@ -527,17 +594,7 @@ async def process_forward_vk_callback(callback_query: CallbackQuery):
         
         if file_ids:
             logger.debug(f"[TRACE] Обработка изображений: file_ids={file_ids}")
-            for file_id in file_ids:
-                try:
-                    logger.debug(f"[TRACE] Получение file_info: file_id={file_id}")
-                    file_info = await bot.get_file(file_id)
-                    photo_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{file_info.file_path}"
-                    photo_id = await upload_photo_to_vk(photo_url, target_vk_group, category)
-                    if photo_id:
-                        attachments.append(photo_id)
-                except Exception as e:
-                    logger.error(f"[TRACE] Ошибка обработки file_id={file_id}: {str(e)}")
-                    continue
+            attachments = await upload_photos_to_vk(file_ids, target_vk_group, category)
         
         logger.debug(f"[TRACE] Вызов post_to_vk: attachments={attachments}")
         success, result = await post_to_vk(message_text, attachments, target_vk_group, category)
@@ -620,64 +677,107 @@ async def process_create_shorts_callback(callback_query: CallbackQuery):
                     logger.warning(f"[TRACE] Ошибка загрузки изображения {file_id}: {str(e)}")
         if len(text) > 600:
             text = await translate_with_deepseek(text, DEEPSEEK_API_KEY, max_length=450)
-        # Генерация видео
-        logger.debug(f"[TRACE] Запуск генерации Shorts: news_id={news_id}")
-        video_path = await generate_shorts(news_id, header, text, image_paths, category)
-        if not video_path:
-            logger.error(f"[TRACE] Не удалось создать видео: news_id={news_id}")
-            await callback_query.answer("Ошибка при создания видео", show_alert=True)
-            return
-        
-        logger.info(f"[TRACE] Видео создано: {video_path}")
-        
-        # Отправка видео в тот же канал
-        logger.debug(f"[TRACE] Отправка видео в канал: chat_id={callback_query.message.chat.id}, video_path={video_path}")
+        # Генерация видео идёт в очереди рендеринга; о ходе работы сообщает notify_shorts_job
+        logger.debug(f"[TRACE] Постановка Shorts в очередь: news_id={news_id}")
+        context = {"chat_id": callback_query.message.chat.id, "news_id": news_id, "header": header,
+                   "image_paths": image_paths, "status_message_id": None}
         try:
-            await bot.send_video(
-                chat_id=callback_query.message.chat.id,
-                video=FSInputFile(video_path),
-                caption=f"Shorts: {header}",
-                parse_mode="HTML",
-                disable_notification=True
-            )
-            logger.info(f"[TRACE] Видео отправлено: news_id={news_id}, video_path={video_path}")
-        except TelegramBadRequest as e:
-            logger.warning(f"[TRACE] Ошибка HTML при отправке видео: {str(e)}. Отправка без HTML")
-            await bot.send_video(
-                chat_id=callback_query.message.chat.id,
-                video=FSInputFile(video_path),
-                caption=f"Shorts: {header}",
-                parse_mode=None,
-                disable_notification=True
-            )
-            logger.info(f"[TRACE] Видео отправлено без HTML: news_id={news_id}, video_path={video_path}")
-        except Exception as e:
-            logger.error(f"[TRACE] Ошибка отправки видео: news_id={news_id}, ошибка: {str(e)}")
-            await callback_query.answer("Ошибка при отправке видео", show_alert=True)
+            job = await shorts_queue.submit((news_id, header, text, image_paths, category),
+                                            notify=notify_shorts_job, context=context)
+        except asyncio.QueueFull:
+            logger.warning(f"[TRACE] Очередь Shorts переполнена: news_id={news_id}")
+            remove_files(image_paths)
+            await callback_query.answer("Очередь видео переполнена, попробуйте позже", show_alert=True)
             return
-        
-        await callback_query.answer(f"Видео создано и отправлено: {video_path}")
-        
-        # Удаление видеофайла
-        try:
-            os.remove(video_path)
-            logger.debug(f"[TRACE] Удалён видеофайл: {video_path}")
-        except Exception as e:
-            logger.warning(f"[TRACE] Ошибка удаления видеофайла: {video_path}, ошибка: {str(e)}")
-        
-        # Очистка временных файлов
-        for path in image_paths:
-            try:
-                os.remove(path)
-                logger.debug(f"[TRACE] Удалён файл: {path}")
-            except Exception as e:
-                logger.warning(f"[TRACE] Ошибка удаления файла: {path}, ошибка: {str(e)}")
+        await callback_query.answer(f"Видео поставлено в очередь (задача {job.id})")
         
     except Exception as e:
         logger.error(f"[TRACE] Ошибка обработки Shorts: news_id={news_id}, ошибка: {str(e)}")
         logger.error(f"[TRACE] Стек: {traceback.format_exc()}")
         await callback_query.answer("Ошибка при создании видео", show_alert=True)
 
+def remove_files(paths):
+    for path in paths:
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+                logger.debug(f"[TRACE] Удалён файл: {path}")
+        except Exception as e:
+            logger.warning(f"[TRACE] Ошибка удаления файла: {path}, ошибка: {str(e)}")
+
+async def send_shorts_video(chat_id, video_path, header):
+    try:
+        await bot.send_video(
+            chat_id=chat_id,
+            video=FSInputFile(video_path),
+            caption=f"Shorts: {header}",
+            parse_mode="HTML",
+            disable_notification=True
+        )
+    except TelegramBadRequest as e:
+        logger.warning(f"[TRACE] Ошибка HTML при отправке видео: {str(e)}. Отправка без HTML")
+        await bot.send_video(
+            chat_id=chat_id,
+            video=FSInputFile(video_path),
+            caption=f"Shorts: {header}",
+            parse_mode=None,
+            disable_notification=True
+        )
+
+async def notify_shorts_job(job):
+    """Сообщает в чат о статусе задачи Shorts: очередь, рендеринг, результат; по завершении чистит файлы."""
+    context = job.context
+    chat_id = context["chat_id"]
+    header = context["header"]
+    cancel_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Отменить", callback_data=f"cancel_shorts_{job.id}")]
+    ])
+    if job.status == JOB_QUEUED:
+        text = f"Shorts в очереди (позиция {shorts_queue.position(job)}): {header}"
+    elif job.status == JOB_RUNNING:
+        text = f"Shorts создаётся: {header}"
+    elif job.status == JOB_DONE:
+        logger.info(f"[TRACE] Видео создано: {job.result}")
+        try:
+            await send_shorts_video(chat_id, job.result, header)
+            logger.info(f"[TRACE] Видео отправлено: news_id={context['news_id']}, video_path={job.result}")
+            text = f"Shorts готово: {header}"
+        except Exception as e:
+            logger.error(f"[TRACE] Ошибка отправки видео: news_id={context['news_id']}, ошибка: {str(e)}")
+            text = f"Ошибка при отправке видео: {header}"
+    elif job.status == JOB_CANCELLED:
+        text = f"Создание Shorts отменено: {header}"
+    else:
+        logger.error(f"[TRACE] Не удалось создать видео: news_id={context['news_id']}, ошибка: {job.error}")
+        text = f"Ошибка при создании видео: {header}"
+    
+    keyboard = cancel_keyboard if job.status in (JOB_QUEUED, JOB_RUNNING) else None
+    if context["status_message_id"] is None:
+        message = await bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, disable_notification=True)
+        context["status_message_id"] = message.message_id
+    else:
+        await bot.edit_message_text(text=text, chat_id=chat_id, message_id=context["status_message_id"], reply_markup=keyboard)
+    
+    if job.status not in (JOB_QUEUED, JOB_RUNNING):
+        remove_files([job.result] + context["image_paths"])
+
+@dp.callback_query(lambda c: c.data.startswith('cancel_shorts_'))
+async def process_cancel_shorts_callback(callback_query: CallbackQuery):
+    logger.debug(f"[TRACE] Начало process_cancel_shorts_callback: {callback_query.data}")
+    try:
+        job_id = int(callback_query.data.replace('cancel_shorts_', ''))
+    except ValueError:
+        await callback_query.answer("Ошибка: неверный формат", show_alert=True)
+        return
+    if await shorts_queue.cancel(job_id):
+        job = shorts_queue.get(job_id)
+        if job.status == JOB_CANCELLED:
+            await callback_query.answer("Создание видео отменено")
+        else:
+            await callback_query.answer("Видео будет отменено после завершения рендеринга")
+    else:
+        await callback_query.answer("Задача уже завершена", show_alert=True)
+
 @dp.callback_query()
 async def debug_callback(callback_query: CallbackQuery):
     logger.debug(f"[TRACE] debug_callback вызван: callback_data={callback_query.data}")
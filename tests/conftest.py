@@ -0,0 +1,28 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+import pytest
+from aiohttp import web
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@asynccontextmanager
+async def serve(routes):
+    """Локальный HTTP-сервер на свободном порту; routes — список (метод, путь, обработчик). Отдаёт базовый URL."""
+    app = web.Application()
+    for method, path, handler in routes:
+        app.router.add_route(method, path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        host, port = runner.addresses[0][:2]
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+@pytest.fixture
+def local_server():
+    """Фабрика локальных серверов: async with local_server(routes) as base_url."""
+    return serve
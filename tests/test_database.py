@@ -0,0 +1,62 @@
+import asyncio
+import json
+import sqlite3
+import time
+import database
+from database import create_table, get_message_data, run_db, run_retention, save_message_data
+
+def create_legacy_db(path):
+    """База в исходной схеме (версия 0) с JSON-списками в messages."""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE news (news_id TEXT PRIMARY KEY, header TEXT)')
+    conn.execute('CREATE TABLE messages (news_id TEXT PRIMARY KEY, caption TEXT, message_ids TEXT, file_ids TEXT, category TEXT)')
+    conn.execute("INSERT INTO news VALUES ('AA1', 'Header')")
+    conn.execute("INSERT INTO messages VALUES ('AA1', 'Caption', ?, ?, 'crypto')",
+                 (json.dumps([101, 102]), json.dumps(["file-a", "file-b"])))
+    conn.commit()
+    conn.close()
+
+def run(coro):
+    async def with_cleanup():
+        try:
+            return await coro
+        finally:
+            await database.close_databases()
+    return asyncio.run(with_cleanup())
+
+def test_migration_keeps_message_children(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    create_legacy_db(db_path)
+
+    async def scenario():
+        await create_table(db_path)
+        database.message_cache.clear(db_path)
+        data = await get_message_data(db_path, "AA1")
+        foreign_keys = await run_db(db_path, lambda conn: conn.execute('PRAGMA foreign_keys').fetchone()[0])
+        return data, foreign_keys
+
+    data, foreign_keys = run(scenario())
+    # Пересоздание messages в миграции 3 не должно каскадом удалить перенесённые строки
+    assert data == ("Caption", [101, 102], ["file-a", "file-b"], "crypto")
+    assert foreign_keys == 1
+
+def test_retention_cascades_to_message_children(tmp_path):
+    db_path = str(tmp_path / "news.db")
+
+    async def scenario():
+        await create_table(db_path)
+        await save_message_data(db_path, "AA1", "Caption", [101], ["file-a"], "crypto")
+        old = int(time.time()) - 40 * 86400
+        def age_message(conn):
+            conn.execute('UPDATE messages SET created_at = ? WHERE news_id = ?', (old, "AA1"))
+            conn.commit()
+        await run_db(db_path, age_message)
+        stats = await run_retention(db_path, messages_days=30)
+        def count_children(conn):
+            return (conn.execute('SELECT COUNT(*) FROM message_ids').fetchone()[0],
+                    conn.execute('SELECT COUNT(*) FROM message_file_ids').fetchone()[0])
+        return stats, await run_db(db_path, count_children)
+
+    stats, children = run(scenario())
+    assert stats["messages"] == 1
+    assert children == (0, 0)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import pytest
+from aiohttp import web
+from tenacity import wait_fixed
+from deepseek_client import CHARS_PER_TOKEN, DeepSeekClient, DeepSeekError, trim_to_token_budget
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+def run_with_server(local_server, handler, scenario, **client_options):
+    async def main():
+        async with local_server([("POST", "/v1/chat/completions", handler)]) as base_url:
+            client = DeepSeekClient(api_key="test-key", url=f"{base_url}/v1/chat/completions", **client_options)
+            client.wait = wait_fixed(0.3)
+            try:
+                return await scenario(client)
+            finally:
+                await client.close()
+    return asyncio.run(main())
+
+def test_chat_returns_content_and_counts_tokens(local_server):
+    async def handler(request):
+        body = await request.json()
+        assert request.headers["Authorization"] == "Bearer test-key"
+        return web.json_response(completion(body["messages"][0]["content"].upper()))
+
+    async def scenario(client):
+        return await client.chat("привет"), client.stats()
+
+    answer, stats = run_with_server(local_server, handler, scenario)
+    assert answer == "ПРИВЕТ"
+    assert stats["requests"] == 1
+    assert stats["prompt_tokens"] == 10 and stats["completion_tokens"] == 5
+
+def test_chat_retries_rate_limit_then_succeeds(local_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            return web.Response(status=429)
+        return web.json_response(completion("ok"))
+
+    async def scenario(client):
+        return await client.chat("text"), client.stats()
+
+    answer, stats = run_with_server(local_server, handler, scenario, retries=3)
+    assert answer == "ok"
+    assert len(calls) == 3
+    assert stats["retries"] == 2 and stats["errors"] == 0
+
+def test_chat_does_not_retry_client_errors(local_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return web.Response(status=400, text="bad request")
+
+    async def scenario(client):
+        with pytest.raises(DeepSeekError, match="HTTP 400"):
+            await client.chat("text")
+        return client.stats()
+
+    stats = run_with_server(local_server, handler, scenario, retries=3)
+    assert len(calls) == 1
+    assert stats["errors"] == 1
+
+def test_chat_gives_up_after_retries(local_server):
+    async def handler(request):
+        return web.Response(status=503)
+
+    async def scenario(client):
+        with pytest.raises(DeepSeekError):
+            await client.chat("text")
+        return client.stats()
+
+    stats = run_with_server(local_server, handler, scenario, retries=2)
+    assert stats["requests"] == 2 and stats["errors"] == 1
+
+def test_backoff_does_not_hold_concurrency_slot(local_server):
+    finished = []
+
+    async def handler(request):
+        prompt = (await request.json())["messages"][0]["content"]
+        if prompt == "limited" and not finished:
+            finished.append("limited-429")
+            return web.Response(status=429)
+        finished.append(prompt)
+        return web.json_response(completion(prompt))
+
+    async def scenario(client):
+        limited = asyncio.create_task(client.chat("limited"))
+        await asyncio.sleep(0.1)
+        # Пока первый запрос ждёт повтора, единственный слот свободен для второго
+        other = await asyncio.wait_for(client.chat("other"), 0.25)
+        return other, await limited
+
+    other, limited = run_with_server(local_server, handler, scenario, concurrency=1)
+    assert (other, limited) == ("other", "limited")
+    assert finished == ["limited-429", "other", "limited"]
+
+def test_trim_to_token_budget_keeps_leading_sentences():
+    text = "Header\n" + " ".join(f"Sentence number {i} is here." for i in range(100))
+    trimmed = trim_to_token_budget(text, max_tokens=20)
+    assert trimmed.startswith("Header\nSentence number 0 is here.")
+    assert trimmed.endswith(".")
+    assert len(trimmed) <= 20 * CHARS_PER_TOKEN
+
+def test_trim_to_token_budget_cuts_overlong_first_sentence():
+    text = "word " * 200 + "end."
+    trimmed = trim_to_token_budget(text, max_tokens=10)
+    # Ни одно предложение не помещается целиком — режем по словам, а не отдаём пустой промпт
+    assert trimmed
+    assert len(trimmed) <= 10 * CHARS_PER_TOKEN
+    assert text.startswith(trimmed)
+    assert not trimmed.endswith(" ")
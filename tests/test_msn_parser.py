@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+import pytest
+from aiohttp import web
+import msn_parser
+from msn_parser import ContentApiClient, CrawlScheduler, fetch_article_api, news_id_from_link, parse_article, parse_article_json
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "msn_content_api")
+ARTICLE_LINK = "https://www.msn.com/en-us/money/markets/bitcoin-climbs/ar-AA1Bq2Xy"
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def test_parse_article_json_article():
+    header, text, image_urls = parse_article_json(json.loads(load_fixture("article.json")), "CoinDesk")
+    assert header == "Bitcoin climbs above $70,000 as ETF inflows return"
+    # Ссылки и выделения вырезаются, пустые абзацы пропускаются
+    assert text == ("Bitcoin rose above  on Monday, its highest level in three weeks."
+                    "Spot bitcoin ETFs took in  on Friday, according to data from Farside."
+                    "Analysts said the move was driven by short covering.")
+    assert image_urls == [
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/AA1Bq2Xy.img",
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/AA1BqChart.img",
+    ]
+
+def test_parse_article_json_keeps_inline_tags_for_selected_sources():
+    _, text, _ = parse_article_json(json.loads(load_fixture("article.json")), "CoinTelegraph")
+    assert text.startswith("Bitcoin rose above $70,000 on Monday")
+    assert "$420 million" in text
+
+def test_parse_article_json_slideshow():
+    header, text, image_urls = parse_article_json(json.loads(load_fixture("slideshow.json")), "ELLE US")
+    assert header == "The best street style from Paris Fashion Week"
+    assert text == "From oversized blazers to ."
+    assert image_urls == [
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/BB1slide1.img",
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/BB1slide2.img",
+    ]
+
+def test_parse_article_json_without_body_raises():
+    try:
+        parse_article_json(json.loads(load_fixture("video_no_body.json")), "Bloomberg")
+    except ValueError:
+        return
+    raise AssertionError("ожидалась ValueError")
+
+def run_fetch(monkeypatch, local_server, handler):
+    """Запускает fetch_article_api против локального сервера; браузер и загрузка изображений подменены."""
+    calls = {"browser": [], "images": []}
+
+    async def fake_parse_article(link, name, pool=None, readiness=None):
+        calls["browser"].append(link)
+        return link, "DOM header", "DOM text", []
+
+    async def fake_download_article_images(news_id, image_urls):
+        calls["images"].append((news_id, image_urls))
+        return [f"img/msn/{news_id}_{j}.jpg" for j in range(len(image_urls))]
+
+    monkeypatch.setattr(msn_parser, "parse_article", fake_parse_article)
+    monkeypatch.setattr(msn_parser, "download_article_images", fake_download_article_images)
+
+    async def scenario():
+        async with local_server([("GET", "/Detail/{locale}/{article_id}", handler)]) as base_url:
+            client = ContentApiClient(base=f"{base_url}/Detail", timeout=5)
+            try:
+                return await fetch_article_api(ARTICLE_LINK, "CoinDesk", client=client, pool=None)
+            finally:
+                await client.close()
+
+    return asyncio.run(scenario()), calls
+
+def test_fetch_article_api_uses_fixture_response(monkeypatch, local_server):
+    requested = []
+
+    async def handler(request):
+        requested.append((request.match_info["locale"], request.match_info["article_id"]))
+        return web.Response(text=load_fixture("article.json"), content_type="application/json")
+
+    result, calls = run_fetch(monkeypatch, local_server, handler)
+    assert requested == [("en-us", "AA1Bq2Xy")]
+    link, header, text, image_paths = result
+    assert header == "Bitcoin climbs above $70,000 as ETF inflows return"
+    assert text.endswith("Analysts said the move was driven by short covering.")
+    news_id = news_id_from_link(ARTICLE_LINK)
+    assert image_paths == [f"img/msn/{news_id}_0.jpg", f"img/msn/{news_id}_1.jpg"]
+    assert calls["images"] == [(news_id, [
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/AA1Bq2Xy.img",
+        "https://img-s-msn-com.akamaized.net/tenant/amp/entityid/AA1BqChart.img",
+    ])]
+    assert calls["browser"] == []
+
+def test_fetch_article_api_falls_back_to_dom_on_http_error(monkeypatch, local_server):
+    async def handler(request):
+        return web.Response(status=503, text="Service Unavailable")
+
+    result, calls = run_fetch(monkeypatch, local_server, handler)
+    assert result == (ARTICLE_LINK, "DOM header", "DOM text", [])
+    assert calls["browser"] == [ARTICLE_LINK]
+    assert calls["images"] == []
+
+def test_fetch_article_api_falls_back_to_dom_on_malformed_json(monkeypatch, local_server):
+    async def handler(request):
+        return web.Response(text=load_fixture("malformed.json"), content_type="application/json")
+
+    result, calls = run_fetch(monkeypatch, local_server, handler)
+    assert result[1:] == ("DOM header", "DOM text", [])
+    assert calls["browser"] == [ARTICLE_LINK]
+
+def test_fetch_article_api_falls_back_to_dom_without_body(monkeypatch, local_server):
+    async def handler(request):
+        return web.Response(text=load_fixture("video_no_body.json"), content_type="application/json")
+
+    result, calls = run_fetch(monkeypatch, local_server, handler)
+    assert result[1] == "DOM header"
+    assert calls["browser"] == [ARTICLE_LINK]
+
+def test_crawl_scheduler_skips_full_host():
+    active = {"a.example": 0, "b.example": 0}
+    peak = {"a.example": 0, "b.example": 0}
+    started = {}
+
+    def job(host, name):
+        async def run():
+            started[name] = time.monotonic()
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.05)
+            active[host] -= 1
+            return name
+        return run
+
+    async def scenario():
+        scheduler = CrawlScheduler(global_limit=3, host_limit=2)
+        started["submit"] = time.monotonic()
+        try:
+            futures = [await scheduler.submit(f"https://a.example/{i}", job("a.example", f"a{i}"), i) for i in range(4)]
+            futures.append(await scheduler.submit("https://b.example/0", job("b.example", "b0"), 10))
+            return await asyncio.gather(*futures)
+        finally:
+            await scheduler.close()
+
+    results = asyncio.run(scenario())
+    assert results == ["a0", "a1", "a2", "a3", "b0"]
+    assert peak == {"a.example": 2, "b.example": 1}
+    # Задача другого хоста стартует сразу, а не после освобождения слота занятого хоста
+    assert started["b0"] - started["submit"] < 0.03
+
+class FakePage:
+    async def goto(self, url, wait_until=None):
+        pass
+
+class FakePool:
+    @asynccontextmanager
+    async def page(self):
+        yield FakePage()
+
+class FakeReadiness:
+    def __init__(self, ready_steps):
+        self.ready_steps = ready_steps
+
+    async def selector(self, page, site, step, selector, state="attached"):
+        return step in self.ready_steps
+
+    async def function(self, page, site, step, expression, arg=None):
+        return step in self.ready_steps
+
+@pytest.mark.parametrize("ready_steps, missing", [(set(), "header"), ({"header"}, "article")])
+def test_parse_article_raises_when_page_is_not_ready(ready_steps, missing):
+    # Статья без заголовка или текста не должна уйти в публикацию как «Без заголовка»
+    with pytest.raises(TimeoutError, match=missing):
+        asyncio.run(parse_article(ARTICLE_LINK, "CoinDesk", FakePool(), FakeReadiness(ready_steps)))
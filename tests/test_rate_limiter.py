@@ -0,0 +1,76 @@
+import asyncio
+import time
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+from rate_limiter import TelegramRateLimiter, TokenBucket
+
+def test_bucket_spaces_waiters_without_serializing_sleep():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=1)
+        started = time.monotonic()
+        waits = await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+        return waits, time.monotonic() - started
+
+    waits, elapsed = asyncio.run(scenario())
+    # Первый проходит сразу, остальные получают очередь с шагом 1/rate
+    assert waits[0] == 0
+    for i, waited in enumerate(waits[1:], start=1):
+        assert abs(waited - i * 0.1) < 0.03
+    # Ожидающие спят одновременно, а не друг за другом: всего ~0.4с, а не 0.1+0.2+0.3+0.4
+    assert elapsed < 0.6
+
+def test_bucket_pause_extends_reserved_wait():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=1)
+        await bucket.acquire()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        bucket.pause(0.2)
+        return await waiter
+
+    assert asyncio.run(scenario()) >= 0.19
+
+def test_answer_callback_query_is_not_throttled():
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append((type(method).__name__, time.monotonic()))
+        return True
+
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=1, chat_rate=1)
+        await limiter(make_request, None, SendMessage(chat_id=42, text="first"))
+        started = time.monotonic()
+        slow = asyncio.create_task(limiter(make_request, None, SendMessage(chat_id=42, text="second")))
+        await asyncio.sleep(0.01)
+        await limiter(make_request, None, AnswerCallbackQuery(callback_query_id="1"))
+        answered = time.monotonic() - started
+        await slow
+        return answered, limiter.stats()
+
+    answered, stats = asyncio.run(scenario())
+    assert answered < 0.1
+    assert [name for name, _ in sent] == ["SendMessage", "AnswerCallbackQuery", "SendMessage"]
+    assert stats["requests"] == 2
+
+def test_bucket_charges_full_cost_above_capacity():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=3)
+        album_wait = await bucket.acquire(10)
+        balance = bucket.tokens
+        next_wait = await bucket.acquire(1)
+        return album_wait, balance, next_wait
+
+    album_wait, balance, next_wait = asyncio.run(scenario())
+    # Альбом из 10 фото уходит сразу при полном ведре, но стоит 10 токенов
+    assert album_wait == 0
+    assert abs(balance + 7) < 0.01
+    assert abs(next_wait - 0.8) < 0.03
+
+def test_chat_bucket_is_shared_between_int_and_str_ids():
+    limiter = TelegramRateLimiter()
+    assert limiter._chat_bucket("-1001234") is limiter._chat_bucket(-1001234)
+    assert limiter._chat_bucket("42") is limiter._chat_bucket(42)
+    # Каналы и группы получают групповой лимит, личные чаты — свой
+    assert limiter._chat_bucket(-1001234).rate == limiter.group_rate
+    assert limiter._chat_bucket("@channel").rate == limiter.group_rate
+    assert limiter._chat_bucket(42).rate == limiter.chat_rate
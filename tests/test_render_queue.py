@@ -0,0 +1,64 @@
+import asyncio
+import time
+from render_queue import JOB_CANCELLED, JOB_DONE, JOB_QUEUED, JOB_RUNNING, RenderQueue
+
+def slow_render(value, seconds):
+    time.sleep(seconds)
+    return value
+
+def test_queue_runs_jobs_in_spawned_processes_and_updates_positions():
+    events = []
+
+    async def scenario():
+        queue = RenderQueue(slow_render, workers=1, queue_size=10)
+        finished = {}
+
+        async def notify(job):
+            events.append((job.id, job.status, queue.position(job)))
+            if job.status in (JOB_DONE, JOB_CANCELLED):
+                finished[job.id].set()
+
+        try:
+            jobs = []
+            for value in ("a", "b", "c"):
+                job = await queue.submit((value, 0.3), notify=notify)
+                finished[job.id] = asyncio.Event()
+                jobs.append(job)
+            await asyncio.wait_for(asyncio.gather(*(finished[job.id].wait() for job in jobs)), 60)
+            return [job.result for job in jobs], queue._pool._mp_context.get_start_method()
+        finally:
+            await queue.close()
+
+    results, start_method = asyncio.run(scenario())
+    assert results == ["a", "b", "c"]
+    assert start_method == "spawn"
+    # Третья задача узнаёт о каждом продвижении в очереди, пока не дойдёт до первого места
+    third = [(status, position) for job_id, status, position in events if job_id == 3]
+    queued = [position for status, position in third if status == JOB_QUEUED]
+    assert queued == list(range(queued[0], 0, -1)) and queued[0] >= 2
+    assert [status for status, _ in third[len(queued):]] == [JOB_RUNNING, JOB_DONE]
+
+def test_cancelling_queued_job_moves_the_rest_up():
+    events = []
+
+    async def scenario():
+        queue = RenderQueue(slow_render, workers=1, queue_size=10)
+
+        async def notify(job):
+            events.append((job.id, job.status, queue.position(job)))
+
+        try:
+            running = await queue.submit(("a", 1.0), notify=notify)
+            # Ждём, пока первая задача займёт процесс, чтобы остальные стояли в очереди
+            while running.status != JOB_RUNNING:
+                await asyncio.sleep(0.01)
+            second = await queue.submit(("b", 0), notify=notify)
+            third = await queue.submit(("c", 0), notify=notify)
+            await queue.cancel(second.id)
+            return third.id
+        finally:
+            await queue.close()
+
+    third_id = asyncio.run(scenario())
+    assert [(status, position) for job_id, status, position in events if job_id == third_id] == [
+        (JOB_QUEUED, 2), (JOB_QUEUED, 1)]
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from aiohttp import web
+from vk_client import VK_TOO_MANY_REQUESTS, VK_TOO_MANY_REQUESTS_RETRIES, VkApiError, VkClient
+
+def vk_error(code, message):
+    return {"error": {"error_code": code, "error_msg": message, "request_params": []}}
+
+def run_with_server(local_server, handler, scenario):
+    async def main():
+        async with local_server([("POST", "/method/{method}", handler)]) as base_url:
+            client = VkClient("vk-token", api_url=f"{base_url}/method", timeout=5)
+            try:
+                return await scenario(client)
+            finally:
+                await client.close()
+    return asyncio.run(main())
+
+def test_call_returns_response_and_sends_token(local_server):
+    requests = []
+
+    async def handler(request):
+        requests.append((request.match_info["method"], dict(await request.post())))
+        return web.json_response({"response": {"post_id": 7}})
+
+    async def scenario(client):
+        return await client.call("wall.post", owner_id=-1, message="text", attachments=None)
+
+    assert run_with_server(local_server, handler, scenario) == {"post_id": 7}
+    method, data = requests[0]
+    assert method == "wall.post"
+    assert data["access_token"] == "vk-token" and data["v"] and data["message"] == "text"
+    # Параметры со значением None не отправляются
+    assert "attachments" not in data
+
+def test_call_raises_api_error_without_retry(local_server):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return web.json_response(vk_error(15, "Access denied"))
+
+    async def scenario(client):
+        with pytest.raises(VkApiError) as error:
+            await client.call("wall.post", owner_id=-1)
+        return error.value
+
+    error = run_with_server(local_server, handler, scenario)
+    assert error.code == 15 and error.method == "wall.post"
+    assert len(requests) == 1
+
+def test_call_retries_too_many_requests(local_server):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        if len(requests) < VK_TOO_MANY_REQUESTS_RETRIES:
+            return web.json_response(vk_error(VK_TOO_MANY_REQUESTS, "Too many requests per second"))
+        return web.json_response({"response": 1})
+
+    async def scenario(client):
+        return await client.call("photos.save", group_id=1)
+
+    assert run_with_server(local_server, handler, scenario) == 1
+    assert len(requests) == VK_TOO_MANY_REQUESTS_RETRIES
+
+def test_call_gives_up_on_persistent_rate_limit(local_server):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return web.json_response(vk_error(VK_TOO_MANY_REQUESTS, "Too many requests per second"))
+
+    async def scenario(client):
+        with pytest.raises(VkApiError) as error:
+            await client.call("photos.save", group_id=1)
+        return error.value
+
+    assert run_with_server(local_server, handler, scenario).code == VK_TOO_MANY_REQUESTS
+    assert len(requests) == VK_TOO_MANY_REQUESTS_RETRIES
+
+def test_upload_server_is_requested_once_for_concurrent_uploads(local_server):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.match_info["method"])
+        return web.json_response({"response": {"upload_url": "http://upload.example/photo"}})
+
+    async def scenario(client):
+        urls = await asyncio.gather(*(client.get_photo_upload_server(5) for _ in range(3)))
+        client.forget_photo_upload_server(5)
+        urls.append(await client.get_photo_upload_server(5))
+        return urls
+
+    assert run_with_server(local_server, handler, scenario) == ["http://upload.example/photo"] * 4
+    assert requests == ["photos.getMessagesUploadServer"] * 2
+
+def run_upload(local_server, source_handler):
+    received = {}
+
+    async def upload(request):
+        received["content_length"] = request.headers.get("Content-Length")
+        received["transfer_encoding"] = request.headers.get("Transfer-Encoding")
+        form = await request.post()
+        received["filename"] = form["photo"].filename
+        received["body"] = form["photo"].file.read()
+        return web.json_response({"server": 1, "photo": "[]", "hash": "h"})
+
+    async def main():
+        async with local_server([("GET", "/file.jpg", source_handler), ("POST", "/upload", upload)]) as base_url:
+            client = VkClient("vk-token", api_url=f"{base_url}/method", timeout=5)
+            try:
+                return await client.upload_from_url(f"{base_url}/upload", "photo", "photo.jpg", f"{base_url}/file.jpg")
+            finally:
+                await client.close()
+
+    return asyncio.run(main()), received
+
+PHOTO = bytes(range(256)) * 1024
+
+def test_upload_streams_with_content_length_when_source_size_is_known(local_server):
+    async def source(request):
+        return web.Response(body=PHOTO, content_type="image/jpeg")
+
+    result, received = run_upload(local_server, source)
+    assert result["server"] == 1
+    assert received["body"] == PHOTO and received["filename"] == "photo.jpg"
+    assert received["content_length"] is not None and received["transfer_encoding"] is None
+
+def test_upload_buffers_when_source_size_is_unknown(local_server):
+    async def source(request):
+        resp = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        for start in range(0, len(PHOTO), 10000):
+            await resp.write(PHOTO[start:start + 10000])
+        await resp.write_eof()
+        return resp
+
+    result, received = run_upload(local_server, source)
+    assert received["body"] == PHOTO
+    # Сервер загрузки VK получает Content-Length и без размера у источника
+    assert received["content_length"] is not None and received["transfer_encoding"] is None
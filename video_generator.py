@@ -7,7 +7,6 @@ from pydub import AudioSegment  # Добавлено для конвертаци
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
 import ffmpeg  # Используем ffmpeg-python
-import asyncio
 from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
 from PIL import ImageOps
 import yandex.cloud.ai.tts.v3.tts_pb2 as tts_pb2  # Добавлено для Yandex SpeechKit
@@ -25,6 +24,13 @@ file_handler.flush = lambda: file_handler.stream.flush()
 
 logger.info("[TRACE] Загрузка video_generator.py, версия с чередованием изображений v5 от 2025-05-20")
 
+# Рендеринг Shorts: "ffmpeg" — один вызов ffmpeg по готовым кадрам, "moviepy" — прежний путь через moviepy.
+# FFMPEG_BINARY — тот же путь к ffmpeg, что использует moviepy.
+SHORTS_RENDERER = os.getenv("SHORTS_RENDERER", "ffmpeg")
+SHORTS_FFMPEG_PRESET = os.getenv("SHORTS_FFMPEG_PRESET", "veryfast")
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+SHORTS_FPS = 30
+
 # Настройки Yandex SpeechKit (Добавлено)
 FOLDER_ID = "b1gohtlu79ud434biqak"
 SERVICE_FUNCTION_ID = "d4ee8ts11lsrrghan8l6"
@@ -137,8 +143,67 @@ def prepare_image(img_path, header, category, news_id, idx):
         logger.error(f"[TRACE] Ошибка в prepare_image: {str(e)}")
         return None
 
-async def generate_shorts(news_id, header, text, image_paths, category):
-    """Генерация короткого видео с текстом, озвучкой и чередованием изображений с использованием moviepy."""
+def render_video_moviepy(image_paths, audio_path, output_path, duration=None):
+    """Склейка кадров и звука через moviepy: каждый кадр проходит через Python."""
+    audio_clip = AudioFileClip(audio_path)
+    # Как ffmpeg-вариант с -shortest: ролик не длиннее ни переданной длительности, ни озвучки
+    duration = min(duration, audio_clip.duration) if duration else audio_clip.duration
+    audio_clip = audio_clip.subclip(0, duration)
+    
+    clips = []
+    duration_per_image = duration / len(image_paths) if len(image_paths) > 1 else duration
+    for img in image_paths:
+        img_clip = ImageClip(img).set_duration(duration_per_image)
+        clips.append(img_clip)
+    
+    video = concatenate_videoclips(clips, method="compose") if len(clips) > 1 else clips[0]
+    video = video.set_audio(audio_clip)
+    video.write_videofile(output_path, codec="libx264", fps=SHORTS_FPS, audio_codec="aac")
+    return output_path
+
+def render_video_ffmpeg(image_paths, audio_path, output_path, duration):
+    """Склейка кадров и звука одним вызовом ffmpeg (concat demuxer), кодирование целиком в ffmpeg.
+
+    Кадры статичны, поэтому x264 работает с tune=stillimage, а Python не участвует в покадровой обработке.
+    """
+    duration_per_image = duration / len(image_paths)
+    list_path = f"{output_path}.ffconcat"
+    entries = [os.path.abspath(img).replace("'", "'\\''") for img in image_paths]
+    lines = ["ffconcat version 1.0"]
+    for entry in entries:
+        lines += [f"file '{entry}'", f"duration {duration_per_image:.3f}"]
+    # Длительность последнего кадра учитывается, только если за ним есть ещё одна запись
+    lines.append(f"file '{entries[-1]}'")
+    with open(list_path, "w", encoding="utf-8") as list_file:
+        list_file.write("\n".join(lines) + "\n")
+    try:
+        video = ffmpeg.input(list_path, f="concat", safe=0)
+        audio = ffmpeg.input(audio_path)
+        (
+            ffmpeg
+            .output(video, audio, output_path, vcodec="libx264", tune="stillimage", preset=SHORTS_FFMPEG_PRESET,
+                    r=SHORTS_FPS, pix_fmt="yuv420p", acodec="aac", shortest=None, movflags="+faststart")
+            .overwrite_output()
+            .run(cmd=FFMPEG_BINARY, quiet=True)
+        )
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"ffmpeg: {e.stderr.decode(errors='replace')[-500:]}") from e
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+    return output_path
+
+def render_video(image_paths, audio_path, output_path, duration, renderer=SHORTS_RENDERER):
+    if renderer == "moviepy":
+        return render_video_moviepy(image_paths, audio_path, output_path, duration)
+    return render_video_ffmpeg(image_paths, audio_path, output_path, duration)
+
+def render_shorts(news_id, header, text, image_paths, category):
+    """Генерация короткого видео с текстом, озвучкой и чередованием изображений с использованием moviepy.
+
+    Полностью синхронная (IAM, gRPC, pydub, Pillow, moviepy), поэтому запускается в пуле процессов
+    очереди рендеринга (render_queue.py), а не в цикле событий бота.
+    """
     logger.debug(f"[TRACE] Генерация Shorts: news_id={news_id}, category={category}, images={image_paths}")
     
     try:
@@ -173,24 +238,11 @@ async def generate_shorts(news_id, header, text, image_paths, category):
             logger.error("[TRACE] Не удалось подготовить ни одно изображение")
             return None
         
-        # Загрузка аудио и создание видео с помощью moviepy
-        audio_clip = AudioFileClip(audio_path)
-        duration = audio_clip.duration
-        
-        clips = []
-        duration_per_image = duration / len(prepared_images) if len(prepared_images) > 1 else duration
-        for img in prepared_images:
-            img_clip = ImageClip(img).set_duration(duration_per_image)
-            clips.append(img_clip)
-        
-        video = concatenate_videoclips(clips, method="compose") if len(clips) > 1 else clips[0]
-        video = video.set_audio(audio_clip)
-        
-        # Сохранение видео
+        # Создание и сохранение видео выбранным способом (SHORTS_RENDERER)
         output_path = f"shorts/{safe_news_id}_shorts.mp4"
         os.makedirs("shorts", exist_ok=True)
-        video.write_videofile(output_path, codec="libx264", fps=30, audio_codec="aac")
-        logger.debug(f"[TRACE] Видео создано: {output_path}")
+        render_video(prepared_images, audio_path, output_path, len(audio_wav) / 1000)
+        logger.debug(f"[TRACE] Видео создано: {output_path} ({SHORTS_RENDERER})")
         
         # Очистка временных файлов
         for path in [audio_path, wav_path] + prepared_images:  # Добавлен wav_path
@@ -203,5 +255,46 @@ async def generate_shorts(news_id, header, text, image_paths, category):
         
         return output_path
     except Exception as e:
-        logger.error(f"[TRACE] Ошибка в generate_shorts: {str(e)}")
-        return None
\ No newline at end of file
+        logger.error(f"[TRACE] Ошибка в render_shorts: {str(e)}")
+        return None
+
+def _benchmark(image_count=3, seconds=30.0, renderers=("moviepy", "ffmpeg")):
+    """Сравнение времени и CPU рендеринга Shorts: moviepy против прямого вызова ffmpeg."""
+    import resource
+    import tempfile
+    import time
+
+    def cpu_seconds():
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Синтетические кадры 1080x1920 и тишина нужной длительности вместо TTS
+        image_paths = []
+        for i in range(image_count):
+            img = Image.effect_noise((1080, 1920), 40 + 20 * i).convert("RGB")
+            path = os.path.join(tmp_dir, f"frame_{i}.png")
+            img.save(path, "PNG")
+            image_paths.append(path)
+        audio_path = os.path.join(tmp_dir, "audio.mp3")
+        (
+            ffmpeg
+            .input("anullsrc=r=44100:cl=mono", f="lavfi", t=seconds)
+            .output(audio_path, acodec="libmp3lame")
+            .overwrite_output()
+            .run(cmd=FFMPEG_BINARY, quiet=True)
+        )
+        for renderer in renderers:
+            output_path = os.path.join(tmp_dir, f"{renderer}.mp4")
+            cpu_before = cpu_seconds()
+            started = time.perf_counter()
+            render_video(image_paths, audio_path, output_path, seconds, renderer=renderer)
+            elapsed = time.perf_counter() - started
+            cpu = cpu_seconds() - cpu_before
+            print(f"{renderer}: {elapsed:.2f}с, CPU {cpu:.2f}с, файл {os.path.getsize(output_path)} байт")
+
+if __name__ == "__main__":
+    # python video_generator.py [число кадров] [длительность, с] — бенчмарк рендеринга
+    import sys
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3, float(sys.argv[2]) if len(sys.argv) > 2 else 30.0)
\ No newline at end of file
@@ -0,0 +1,132 @@
+import aiohttp
+import asyncio
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройки клиента VK; VK_API_URL можно направить на локальный тестовый сервер
+load_dotenv('keys.env')
+VK_API_URL = os.getenv("VK_API_URL", "https://api.vk.com/method")
+VK_API_VERSION = os.getenv("VK_API_VERSION", "5.131")
+VK_TIMEOUT = float(os.getenv("VK_TIMEOUT", "10"))
+# VK допускает не больше 3 запросов в секунду на токен
+VK_REQUEST_INTERVAL = 0.34
+VK_TOO_MANY_REQUESTS = 6
+VK_TOO_MANY_REQUESTS_RETRIES = 3
+# Сколько секунд переиспользовать адрес сервера загрузки фото для группы
+VK_UPLOAD_SERVER_TTL = float(os.getenv("VK_UPLOAD_SERVER_TTL", "600"))
+# Размер блока при потоковой передаче файла из источника на сервер загрузки
+VK_STREAM_CHUNK = 64 * 1024
+# Сколько фото одного поста загружается в VK одновременно
+VK_UPLOAD_CONCURRENCY = int(os.getenv("VK_UPLOAD_CONCURRENCY", "3"))
+
+class _SizedStreamPayload(aiohttp.payload.AsyncIterablePayload):
+    """Потоковое тело заранее известного размера: multipart-запрос уходит с Content-Length, а не chunked."""
+    def __init__(self, value, size, **kwargs):
+        super().__init__(value, **kwargs)
+        self._known_size = size
+
+    @property
+    def size(self):
+        return self._known_size
+
+class VkApiError(Exception):
+    """Ошибка, которую вернул метод VK API."""
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("error_code")
+        self.error = error
+        super().__init__(f"[{self.code}] {error.get('error_msg')} ({method})")
+
+class VkClient:
+    """Асинхронный клиент VK API на общей aiohttp-сессии.
+
+    Не блокирует цикл событий: вызовы методов, скачивание и загрузка файлов идут через
+    keep-alive соединения. Как и vk_api, выдерживает паузу между запросами одного токена
+    и повторяет запрос при ошибке «слишком много запросов в секунду».
+    """
+    def __init__(self, token, api_url=VK_API_URL, version=VK_API_VERSION, timeout=VK_TIMEOUT):
+        self.token = token
+        self.api_url = api_url.rstrip('/')
+        self.version = version
+        self.timeout = timeout
+        self._session = None
+        self._lock = asyncio.Lock()
+        self._last_request = 0.0
+        self._upload_servers = {}
+        self._upload_servers_lock = asyncio.Lock()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def _throttle(self):
+        async with self._lock:
+            delay = self._last_request + VK_REQUEST_INTERVAL - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request = time.monotonic()
+
+    async def call(self, method, **params):
+        """Вызывает метод VK API и возвращает поле response; ошибку VK бросает как VkApiError."""
+        data = {key: value for key, value in params.items() if value is not None}
+        data.update(access_token=self.token, v=self.version)
+        for attempt in range(1, VK_TOO_MANY_REQUESTS_RETRIES + 1):
+            await self._throttle()
+            async with self._get_session().post(f"{self.api_url}/{method}", data=data) as resp:
+                resp.raise_for_status()
+                result = await resp.json(content_type=None)
+            if "error" not in result:
+                return result["response"]
+            error = VkApiError(method, result["error"])
+            if error.code != VK_TOO_MANY_REQUESTS or attempt == VK_TOO_MANY_REQUESTS_RETRIES:
+                raise error
+            logger.debug(f"VK: слишком много запросов ({method}), повтор")
+
+    async def upload_from_url(self, upload_url, field, filename, source_url):
+        """Передаёт файл с source_url на сервер загрузки.
+
+        Сервер загрузки VK ждёт тело с Content-Length, поэтому файл идёт потоком, только если
+        источник сообщил размер несжатого содержимого; иначе он сначала читается в память.
+        """
+        session = self._get_session()
+        async with session.get(source_url) as source:
+            source.raise_for_status()
+            content_type = source.content_type or 'application/octet-stream'
+            size = source.content_length
+            if size is not None and source.headers.get('Content-Encoding', 'identity') == 'identity':
+                payload = _SizedStreamPayload(source.content.iter_chunked(VK_STREAM_CHUNK), size, content_type=content_type)
+            else:
+                logger.debug(f"VK: размер {filename} неизвестен, загрузка через буфер")
+                payload = aiohttp.payload.BytesPayload(await source.read(), content_type=content_type)
+            payload.set_content_disposition('form-data', name=field, filename=filename)
+            form = aiohttp.MultipartWriter('form-data')
+            form.append_payload(payload)
+            async with session.post(upload_url, data=form) as resp:
+                resp.raise_for_status()
+                return await resp.json(content_type=None)
+
+    async def get_photo_upload_server(self, group_id, ttl=VK_UPLOAD_SERVER_TTL):
+        """Адрес сервера загрузки фото для группы; кэшируется на ttl секунд."""
+        # Параллельные загрузки одного поста ждут один общий запрос адреса
+        async with self._upload_servers_lock:
+            cached = self._upload_servers.get(group_id)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+            upload_server = await self.call('photos.getMessagesUploadServer', group_id=group_id)
+            self._upload_servers[group_id] = (upload_server['upload_url'], time.monotonic() + ttl)
+            return upload_server['upload_url']
+
+    def forget_photo_upload_server(self, group_id):
+        self._upload_servers.pop(group_id, None)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None